@@ -0,0 +1,148 @@
+from math import ceil
+
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+
+from recipes.models import Ingredient, Recipe, ShoppingList, Tag
+from recipes.synthetic import USERNAME_PREFIX, WORDS
+from users.models import CustomUser, Subscribe
+
+PAGES = 5
+
+
+def isolated_cache(name):
+    """
+    Пустой LocMemCache процесса вместо настроенного кэша.
+
+    Замеры очищают кэш, чтобы увидеть запросы промахов, и не должны
+    трогать общий кэш приложения (Redis, memcached) живых воркеров.
+    """
+    return override_settings(
+        CACHES={
+            DEFAULT_CACHE_ALIAS: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': name,
+            }
+        }
+    )
+
+
+def get_benchmark_user(user_id=None):
+    """Синтетический пользователь с подписками и списком покупок."""
+    if user_id is not None:
+        return CustomUser.objects.get(id=user_id)
+    user = (
+        CustomUser.objects.filter(
+            username__startswith=USERNAME_PREFIX,
+            id__in=Subscribe.objects.values('user_id'),
+        )
+        .filter(id__in=ShoppingList.objects.values('user_id'))
+        .first()
+    )
+    if user is None:
+        raise CommandError(
+            'Нет данных: заполните базу командой generate_data'
+        )
+    return user
+
+
+def get_scenarios(user):
+    """{название: (нужна ли авторизация, список URL)}."""
+    recipe_ids = list(
+        Recipe.objects.order_by('-favorites_count', '-id').values_list(
+            'id', flat=True
+        )[:PAGES]
+    )
+    author_ids = list(
+        CustomUser.objects.order_by('-recipes_count', 'id').values_list(
+            'id', flat=True
+        )[:PAGES]
+    )
+    tags = list(Tag.objects.values_list('slug', flat=True)[:PAGES + 1])
+    ingredient = Ingredient.objects.order_by('id').first()
+    pages = range(1, PAGES + 1)
+    favorite_pages = range(
+        1, min(PAGES, ceil(user.favourite_user.count() / 6)) + 1
+    )
+    subscription_pages = range(
+        1, min(PAGES, ceil(user.subscriber.count() / 6)) + 1
+    )
+    return {
+        'recipes_anonymous': (
+            False,
+            [f'/api/recipes/?limit=6&page={page}' for page in pages],
+        ),
+        'recipes': (
+            True,
+            [f'/api/recipes/?limit=6&page={page}' for page in pages],
+        ),
+        'recipes_by_tags': (
+            True,
+            [
+                f'/api/recipes/?limit=6&tags={first}&tags={second}'
+                for first, second in zip(tags, tags[1:])
+            ],
+        ),
+        'recipes_favorited': (
+            True,
+            [
+                f'/api/recipes/?limit=6&is_favorited=1&page={page}'
+                for page in favorite_pages
+            ],
+        ),
+        'recipes_in_cart': (
+            True,
+            ['/api/recipes/?limit=6&is_in_shopping_cart=1'],
+        ),
+        'recipes_popular': (
+            True,
+            [
+                f'/api/recipes/?limit=6&ordering=popular&page={page}'
+                for page in pages
+            ],
+        ),
+        'recipes_by_author': (
+            True,
+            [
+                f'/api/recipes/?limit=6&author={author_id}'
+                for author_id in author_ids
+            ],
+        ),
+        'recipes_search': (
+            True,
+            [
+                f'/api/recipes/?limit=6&search={word}'
+                for word in WORDS[:PAGES]
+            ],
+        ),
+        'recipe_detail': (
+            True,
+            [f'/api/recipes/{recipe_id}/' for recipe_id in recipe_ids],
+        ),
+        'subscriptions': (
+            True,
+            [
+                f'/api/users/subscriptions/?recipes_limit=3&limit=6'
+                f'&page={page}'
+                for page in subscription_pages
+            ],
+        ),
+        'download_shopping_cart': (
+            True,
+            [
+                f'/api/recipes/download_shopping_cart/?format={fmt}'
+                for fmt in ('txt', 'csv', 'md')
+            ],
+        ),
+        'tags': (False, ['/api/tags/']),
+        'ingredients_search': (
+            False,
+            [
+                f'/api/ingredients/?name={ingredient.name[:length]}'
+                for length in range(1, 4)
+            ]
+            if ingredient
+            else [],
+        ),
+    }
@@ -1,5 +1,78 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from foodgram.settings import APPROXIMATE_COUNT_THRESHOLD, CURSOR_PAGE_SIZE
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по pg_class.reltuples для запросов без фильтров.
+
+    Для отфильтрованных запросов и других СУБД возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class ApproximateCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            estimate = estimate_count(self.object_list)
+            if estimate and estimate >= APPROXIMATE_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class KeysetPaginator(CursorPagination):
+    """Курсорная пагинация по ключу view.cursor_ordering без OFFSET/COUNT."""
+
+    page_size = CURSOR_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
 
 
 class CustomPaginator(PageNumberPagination):
+    """
+    Номера страниц или KeysetPaginator по ?pagination=cursor.
+
+    Курсор строится по колонкам QuerySet, поэтому списки, отсортированные
+    в памяти (например, ранжированные рецепты pantry), всегда делятся
+    по номерам страниц.
+    """
+
     page_size_query_param = 'limit'
+    django_paginator_class = ApproximateCountPaginator
+    pagination_query_param = 'pagination'
+
+    def __init__(self):
+        self.keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if hasattr(queryset, 'query') and (
+            request.query_params.get(self.pagination_query_param) == 'cursor'
+            or KeysetPaginator.cursor_query_param in request.query_params
+        ):
+            self.keyset = KeysetPaginator()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,89 @@
+import logging
+import time
+
+from django.core.cache import cache
+from django.db.models import F
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_TIMEOUT = 60 * 60
+
+
+class FeedStats:
+    """Счётчики кэша ленты в пределах процесса."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.assembly_time = 0.0
+        self.requests = 0
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def add(self, hits, misses, duration):
+        self.hits += hits
+        self.misses += misses
+        self.assembly_time += duration
+        self.requests += 1
+
+
+stats = FeedStats()
+
+
+def fragment_key(recipe):
+    """
+    Ключ фрагмента: id и Recipe.version.
+
+    Версия рецепта лежит в БД, поэтому правку рецепта, его тегов и
+    ингредиентов видят все воркеры, даже с локальным кэшем процесса,
+    а откат транзакции откатывает и её.
+    """
+    return f'recipe-card:{recipe.id}.{recipe.version}'
+
+
+def invalidate(recipe_ids):
+    """Новая версия карточек: старые фрагменты больше не читаются."""
+    Recipe.objects.filter(id__in=recipe_ids).update(version=F('version') + 1)
+
+
+def assemble(recipes, serializer, build_fragments):
+    """
+    Собирает страницу ленты из закэшированных фрагментов.
+
+    recipes - облегчённые объекты страницы (id, version и пользовательские
+    аннотации), build_fragments(ids) сериализует промахи кэша.
+    Пользовательские поля дописываются методами serializer.
+    """
+    started = time.monotonic()
+    keys = {recipe.id: fragment_key(recipe) for recipe in recipes}
+    fragments = cache.get_many(keys.values())
+    missing = [
+        recipe_id for recipe_id, key in keys.items() if key not in fragments
+    ]
+    if missing:
+        built = {
+            keys[fragment['id']]: fragment
+            for fragment in build_fragments(missing)
+        }
+        cache.set_many(built, FRAGMENT_TIMEOUT)
+        fragments.update(built)
+    data = [
+        serializer.merge_fragment(fragments[keys[recipe.id]], recipe)
+        for recipe in recipes
+        if keys[recipe.id] in fragments
+    ]
+    duration = time.monotonic() - started
+    hits = len(keys) - len(missing)
+    stats.add(hits, len(missing), duration)
+    logger.debug(
+        'Лента: %s из кэша, %s собрано, %.1f мс',
+        hits,
+        len(missing),
+        duration * 1000,
+    )
+    return data, hits, len(missing), duration
@@ -0,0 +1,227 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmarks import get_benchmark_user, get_scenarios, isolated_cache
+from foodgram.profiling import RequestProfile
+from recipes.models import Recipe
+from users.models import CustomUser
+
+MIN_REGRESSION_MS = 5
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет горячие эндпоинты API через тестовый клиент и считает '
+        'p50/p95 задержки, запросы к БД и память на запрос; результат '
+        'можно сохранить в JSON и сравнить с базовым'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=30,
+            help='Сколько измерений на сценарий',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=1,
+            help='Сколько раз пройти по всем URL сценария до измерений',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            dest='scenarios',
+            help='Запустить только этот сценарий (можно несколько раз)',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='id пользователя, от имени которого идут запросы',
+        )
+        parser.add_argument('--output', help='Куда сохранить JSON')
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого запуска, с которым сравнить результат',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.5,
+            help='Допустимый рост p50 относительно базового, доля',
+        )
+
+    @staticmethod
+    def fetch(client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def fetch_profiled(self, client, url, cold):
+        if cold:
+            cache.clear()
+        profile = RequestProfile()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(profile)
+                )
+            started = time.perf_counter()
+            status = self.fetch(client, url)
+            duration = time.perf_counter() - started
+        return status, duration, profile
+
+    def measure_memory(self, client, url, cold):
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            self.fetch(client, url)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def run_scenario(self, client, urls, options):
+        for url in urls * options['warmup']:
+            self.fetch(client, url)
+        timings = []
+        queries = []
+        db_times = []
+        errors = 0
+        for number in range(options['repeat']):
+            status, duration, profile = self.fetch_profiled(
+                client, urls[number % len(urls)], options['cold']
+            )
+            errors += status >= 400
+            timings.append(duration * 1000)
+            queries.append(profile.queries)
+            db_times.append(profile.db_time * 1000)
+        peak = max(
+            self.measure_memory(client, url, options['cold']) for url in urls
+        )
+        return {
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(statistics.quantiles(timings, n=20)[-1], 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'db_ms': round(statistics.fmean(db_times), 2),
+            'queries': round(statistics.fmean(queries), 2),
+            'max_queries': max(queries),
+            'peak_kib': round(peak / 1024),
+            'errors': errors,
+        }
+
+    def compare(self, results, baseline, tolerance):
+        """
+        Регрессии: выросло число запросов или p50 больше допуска.
+
+        p95 на десятках измерений слишком шумный, он только печатается.
+        """
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['max_queries'] > base['max_queries']:
+                regressions.append(
+                    f'{name}: запросов {result["max_queries"]}, '
+                    f'было {base["max_queries"]}'
+                )
+            if (
+                result['p50_ms'] > base['p50_ms'] * (1 + tolerance)
+                and result['p50_ms'] - base['p50_ms'] > MIN_REGRESSION_MS
+            ):
+                regressions.append(
+                    f'{name}: p50 {result["p50_ms"]} мс, '
+                    f'было {base["p50_ms"]} мс'
+                )
+            if result['errors'] > base['errors']:
+                regressions.append(f'{name}: ошибок {result["errors"]}')
+        return regressions
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 2:
+            raise CommandError('Для p95 нужно хотя бы два измерения')
+        user = get_benchmark_user(options['user'])
+        anonymous = APIClient()
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        scenarios = get_scenarios(user)
+        unknown = set(options['scenarios'] or ()) - scenarios.keys()
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+        results = {}
+        with isolated_cache('benchmark_api'), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            for name, (authenticated, urls) in scenarios.items():
+                if not urls or (
+                    options['scenarios'] and name not in options['scenarios']
+                ):
+                    continue
+                result = results[name] = self.run_scenario(
+                    client if authenticated else anonymous, urls, options
+                )
+                self.stdout.write(
+                    f'{name}: p50 {result["p50_ms"]} мс, '
+                    f'p95 {result["p95_ms"]} мс, '
+                    f'запросов {result["queries"]}, '
+                    f'БД {result["db_ms"]} мс, '
+                    f'память {result["peak_kib"]} КиБ'
+                    + (
+                        f', ошибок {result["errors"]}'
+                        if result['errors']
+                        else ''
+                    )
+                )
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(timespec='seconds'),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'users': CustomUser.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'repeat': options['repeat'],
+                'cold': options['cold'],
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+                file.write('\n')
+        if not options['baseline']:
+            return
+        with open(options['baseline'], encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = self.compare(
+            results, baseline['scenarios'], options['tolerance']
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базового запуска:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,186 @@
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+from foodgram.databases import CONNECTION_PROFILES, database_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает накладные расходы на соединение с БД в профилях '
+        'direct, persistent и pool: задержку HTTP-запроса из нескольких '
+        'SQL-запросов, пропускную способность и число новых соединений'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile',
+            action='append',
+            dest='profiles',
+            choices=CONNECTION_PROFILES,
+            help='Профиль соединений (по умолчанию все)',
+        )
+        parser.add_argument(
+            '--pgbouncer',
+            action='store_true',
+            help='Настройки для PgBouncer (DB_PGBOUNCER)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Сколько HTTP-запросов сымитировать на профиль',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=3,
+            help='SQL-запросов на HTTP-запрос',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Число потоков, как у воркера с потоками или ASGI',
+        )
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    @staticmethod
+    def simulate_request(connection, queries):
+        """
+        Жизненный цикл соединения в HTTP-запросе Django.
+
+        close_if_unusable_or_obsolete() - то, что делает
+        close_old_connections по сигналам request_started и
+        request_finished.
+        """
+        started = time.perf_counter()
+        connection.close_if_unusable_or_obsolete()
+        with connection.cursor() as cursor:
+            for _ in range(queries):
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        connection.close_if_unusable_or_obsolete()
+        return (time.perf_counter() - started) * 1000
+
+    def run_thread(self, alias, requests, queries):
+        connection = connections[alias]
+        try:
+            return [
+                self.simulate_request(connection, queries)
+                for _ in range(requests)
+            ]
+        finally:
+            connection.close()
+
+    @staticmethod
+    @contextmanager
+    def profile_alias(profile, pgbouncer):
+        """
+        Временный alias с настройками профиля в django.db.connections.
+
+        Отдельный ConnectionHandler не подходит: обработчики сигнала
+        connection_created (django.contrib.postgres) ищут alias в
+        глобальных connections.
+        """
+        alias = f'benchmark_{profile}'
+        database = database_settings(
+            settings.DATABASE,
+            profile,
+            settings.DB_CONN_MAX_AGE,
+            settings.DB_POOL_OPTIONS,
+            pgbouncer,
+        )
+        connections.settings[alias] = connections.configure_settings(
+            {
+                DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+                alias: database,
+            }
+        )[alias]
+        try:
+            yield alias
+        finally:
+            connection = connections[alias]
+            close_pool = getattr(connection, 'close_pool', None)
+            if close_pool is not None:
+                close_pool()
+            connection.close()
+            del connections[alias]
+            del connections.settings[alias]
+
+    def run_threads(self, alias, options):
+        threads = options['threads']
+        per_thread = options['requests'] // threads
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            results = list(
+                executor.map(
+                    lambda _: self.run_thread(
+                        alias, per_thread, options['queries']
+                    ),
+                    range(threads),
+                )
+            )
+        elapsed = time.perf_counter() - started
+        return [timing for thread in results for timing in thread], elapsed
+
+    def run_profile(self, profile, options):
+        connects = 0
+        lock = threading.Lock()
+
+        def count_connect(connection, **kwargs):
+            nonlocal connects
+            if connection.alias == alias:
+                with lock:
+                    connects += 1
+
+        with self.profile_alias(profile, options['pgbouncer']) as alias:
+            connection_created.connect(count_connect, weak=False)
+            try:
+                timings, elapsed = self.run_threads(alias, options)
+            finally:
+                connection_created.disconnect(count_connect)
+            pool = getattr(connections[alias], 'pool', None)
+            if pool is not None:
+                # Для пула сигнал приходит на каждую выдачу из пула.
+                connects = pool.get_stats()['connections_num']
+        return {
+            'requests': len(timings),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(statistics.quantiles(timings, n=20)[-1], 3),
+            'connects': connects,
+        }
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2 * options['threads']:
+            raise CommandError('Нужно хотя бы два запроса на поток')
+        results = {}
+        for profile in options['profiles'] or CONNECTION_PROFILES:
+            result = results[profile] = self.run_profile(profile, options)
+            self.stdout.write(
+                f'{profile}: {result["rps"]} запросов/с, '
+                f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+                f'новых соединений {result["connects"]}'
+            )
+        if options['output']:
+            report = {
+                'meta': {
+                    'requests': options['requests'],
+                    'queries': options['queries'],
+                    'threads': options['threads'],
+                    'pgbouncer': options['pgbouncer'],
+                },
+                'profiles': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+                file.write('\n')
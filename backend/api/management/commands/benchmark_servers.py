@@ -0,0 +1,222 @@
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.encoding import iri_to_uri
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import get_benchmark_user, get_scenarios
+
+MODES = {
+    'wsgi': {'SERVER_MODE': 'wsgi', 'ASYNC_VIEWS': 'false'},
+    'asgi-sync': {'SERVER_MODE': 'asgi', 'ASYNC_VIEWS': 'false'},
+    'asgi': {'SERVER_MODE': 'asgi', 'ASYNC_VIEWS': 'true'},
+}
+DEFAULT_SCENARIOS = (
+    'recipes',
+    'recipe_detail',
+    'tags',
+    'ingredients_search',
+    'download_shopping_cart',
+)
+START_TIMEOUT = 30
+
+
+def run_client(port, requests, offset, deadline):
+    """Клиент с keep-alive: запросы по кругу с offset до deadline."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    timings = []
+    errors = 0
+    number = offset
+    while time.perf_counter() < deadline:
+        url, headers = requests[number % len(requests)]
+        number += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', url, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            errors += response.status >= 400
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            errors += 1
+        timings.append((time.perf_counter() - started) * 1000)
+    connection.close()
+    return timings, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает gunicorn в режимах wsgi, asgi-sync (uvicorn, синхронные '
+        'view) и asgi (uvicorn, асинхронные view) с одинаковым числом '
+        'воркеров и сравнивает пропускную способность под нагрузкой'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            action='append',
+            dest='modes',
+            choices=MODES,
+            help='Режим сервера (по умолчанию все)',
+        )
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Число одновременных клиентов',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность измерения, с',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=float,
+            default=3,
+            help='Нагрузка до измерения, с',
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            dest='scenarios',
+            help='Сценарий из benchmark_api (по умолчанию читающие)',
+        )
+        parser.add_argument('--user', type=int)
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    def get_requests(self, options):
+        user = get_benchmark_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        auth = {'Authorization': f'Token {token.key}'}
+        scenarios = get_scenarios(user)
+        names = options['scenarios'] or DEFAULT_SCENARIOS
+        unknown = set(names) - scenarios.keys()
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+        return [
+            (iri_to_uri(url), auth if authenticated else {})
+            for name in names
+            for authenticated, urls in [scenarios[name]]
+            for url in urls
+        ]
+
+    def start_server(self, mode, port, workers):
+        env = {
+            **os.environ,
+            **MODES[mode],
+            'ALLOWED_HOSTS': ' '.join([*settings.ALLOWED_HOSTS, '127.0.0.1']),
+        }
+        output = None if self.verbosity > 1 else subprocess.DEVNULL
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                '-m',
+                'gunicorn',
+                '--config',
+                'gunicorn.conf.py',
+                '--bind',
+                f'127.0.0.1:{port}',
+                '--workers',
+                str(workers),
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=output,
+            stderr=output,
+        )
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер {mode} не запустился')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'Сервер {mode} не ответил за {START_TIMEOUT} с')
+
+    @staticmethod
+    def load(port, requests, concurrency, duration):
+        deadline = time.perf_counter() + duration
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(
+                pool.map(
+                    lambda offset: run_client(
+                        port, requests, offset, deadline
+                    ),
+                    range(concurrency),
+                )
+            )
+        timings = [timing for client, _ in results for timing in client]
+        return timings, sum(errors for _, errors in results)
+
+    def run_mode(self, mode, requests, options):
+        server = self.start_server(mode, options['port'], options['workers'])
+        try:
+            self.load(
+                options['port'],
+                requests,
+                options['concurrency'],
+                options['warmup'],
+            )
+            timings, errors = self.load(
+                options['port'],
+                requests,
+                options['concurrency'],
+                options['duration'],
+            )
+        finally:
+            server.terminate()
+            server.wait(START_TIMEOUT)
+        if len(timings) < 2:
+            raise CommandError(f'{mode}: слишком мало ответов')
+        return {
+            'requests': len(timings),
+            'rps': round(len(timings) / options['duration'], 1),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(statistics.quantiles(timings, n=20)[-1], 2),
+            'errors': errors,
+        }
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        requests = self.get_requests(options)
+        results = {}
+        for mode in options['modes'] or MODES:
+            result = results[mode] = self.run_mode(mode, requests, options)
+            self.stdout.write(
+                f'{mode}: {result["rps"]} запросов/с, '
+                f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+                f'ошибок {result["errors"]}'
+            )
+        if options['output']:
+            report = {
+                'meta': {
+                    'workers': options['workers'],
+                    'concurrency': options['concurrency'],
+                    'duration': options['duration'],
+                    'scenarios': list(
+                        options['scenarios'] or DEFAULT_SCENARIOS
+                    ),
+                },
+                'modes': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+                file.write('\n')
@@ -0,0 +1,144 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.benchmarks import isolated_cache
+from recipes.models import Ingredient, Recipe, ShoppingList, Tag
+from users.models import CustomUser, Subscribe
+
+APP_TABLE_PREFIXES = ('recipes_', 'users_')
+
+
+def iter_plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from iter_plan_nodes(child)
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет горячие эндпоинты API, делает EXPLAIN каждого запроса '
+        'с enable_seqscan = off и падает, если какой-то запрос '
+        'фильтрует таблицу приложения полным сканированием'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='id пользователя, от имени которого идут запросы',
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Печатать план каждого запроса',
+        )
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            return CustomUser.objects.get(id=user_id)
+        user_ids = ShoppingList.objects.values('user_id')
+        user = (
+            CustomUser.objects.filter(
+                id__in=Subscribe.objects.values('user_id')
+            )
+            .filter(id__in=user_ids)
+            .first()
+            or CustomUser.objects.filter(id__in=user_ids).first()
+            or CustomUser.objects.first()
+        )
+        if user is None:
+            raise CommandError(
+                'Нет данных: заполните базу перед проверкой планов'
+            )
+        return user
+
+    def get_urls(self):
+        tag = Tag.objects.first()
+        recipe = Recipe.objects.exclude(author=None).first()
+        ingredient = Ingredient.objects.first()
+        urls = [
+            '/api/recipes/?limit=6',
+            '/api/recipes/?limit=6&page=2',
+            '/api/recipes/?is_favorited=1&limit=6',
+            '/api/recipes/?is_in_shopping_cart=1&limit=6',
+            '/api/recipes/?ordering=popular&limit=6',
+            '/api/users/subscriptions/?recipes_limit=3&limit=6',
+            '/api/recipes/download_shopping_cart/?format=txt',
+        ]
+        if tag is not None:
+            urls.append(f'/api/recipes/?tags={tag.slug}&limit=6')
+        if recipe is not None:
+            urls.append(f'/api/recipes/?author={recipe.author_id}&limit=6')
+            urls.append(f'/api/recipes/{recipe.id}/')
+        if ingredient is not None:
+            urls.append(f'/api/ingredients/?name={ingredient.name[:3]}')
+        return urls
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']
+
+    def check_url(self, client, url, verbose_plans):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.stdout.write(
+            f'{url}: {response.status_code}, '
+            f'запросов {len(context.captured_queries)}'
+        )
+        failures = 0
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = self.explain(sql)
+            if verbose_plans:
+                self.stdout.write(json.dumps(plan, indent=2))
+            for node in iter_plan_nodes(plan):
+                table = node.get('Relation Name', '')
+                if (
+                    node['Node Type'] == 'Seq Scan'
+                    and 'Filter' in node
+                    and table.startswith(APP_TABLE_PREFIXES)
+                ):
+                    failures += 1
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f'  Seq Scan {table} ({node["Filter"]}): '
+                            f'{sql[:200]}'
+                        )
+                    )
+        return failures
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов работает только с PostgreSQL')
+        client = APIClient()
+        client.force_authenticate(self.get_user(options['user']))
+        failures = 0
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            with isolated_cache('explain_api_queries'), override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+            ):
+                for url in self.get_urls():
+                    failures += self.check_url(
+                        client, url, options['verbose_plans']
+                    )
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+        if failures:
+            raise CommandError(f'Запросов без подходящего индекса: {failures}')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
@@ -0,0 +1,165 @@
+import hashlib
+import json
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodgram.settings import (
+    ASYNC_VIEWS,
+    REFERENCE_CACHE_MAX_AGE,
+    REFERENCE_CACHE_TIMEOUT,
+)
+from recipes.versions import aget_versions, get_versions
+
+
+class AsyncViewSetMixin:
+    """
+    Асинхронный dispatch ViewSet при ASYNC_VIEWS (режим ASGI).
+
+    Для действия action вызывается корутина a<action>, если она есть,
+    иначе синхронный обработчик в потоке через sync_to_async. initial()
+    (аутентификация по токену, права) тоже синхронный и идёт в потоке.
+    Без ASYNC_VIEWS ViewSet работает как обычно.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not ASYNC_VIEWS:
+            return view
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        return update_wrapper(async_view, view)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not ASYNC_VIEWS:
+            return super().dispatch(request, *args, **kwargs)
+        return self.adispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = self.get_async_handler(request)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    def get_async_handler(self, request):
+        method = request.method.lower()
+        if method not in self.http_method_names:
+            return sync_to_async(self.http_method_not_allowed)
+        handler = getattr(self, method, None)
+        if handler is None:
+            return sync_to_async(self.http_method_not_allowed)
+        async_handler = getattr(self, f'a{self.action}', None)
+        if async_handler is not None:
+            return async_handler
+        return sync_to_async(handler)
+
+
+class CachedReferenceMixin:
+    """
+    Кэш ответов list/retrieve для справочников.
+
+    Ключ включает версии cache_models, которые поднимаются сигналами
+    save/delete, поэтому изменения сразу дают новый ключ. Ответ несёт
+    сильный ETag, и при совпадении If-None-Match отдаётся 304 без тела.
+    """
+
+    cache_models = ()
+
+    def get_cache_key(self, request, versions=None):
+        if versions is None:
+            versions = get_versions(self.cache_models)
+        return (
+            f'api:{self.basename}:{".".join(map(str, versions))}:'
+            f'{request.accepted_media_type}:{request.get_full_path()}'
+        )
+
+    @staticmethod
+    def make_cache_entry(response):
+        """(data, etag) для ответа 200, иначе None."""
+        if response.status_code != status.HTTP_200_OK:
+            return None
+        data = response.data
+        content = json.dumps(
+            data, cls=DjangoJSONEncoder, ensure_ascii=False, sort_keys=True
+        )
+        return data, '"{}"'.format(hashlib.md5(content.encode()).hexdigest())
+
+    @staticmethod
+    def cached_reply(request, data, etag):
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={REFERENCE_CACHE_MAX_AGE}',
+        }
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
+            )
+        else:
+            response = Response(data, headers=headers)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def cached_response(self, view_method, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = view_method(request, *args, **kwargs)
+            cached = self.make_cache_entry(response)
+            if cached is None:
+                return response
+            cache.set(key, cached, REFERENCE_CACHE_TIMEOUT)
+        return self.cached_reply(request, *cached)
+
+    async def acached_response(self, view_method, request, *args, **kwargs):
+        """Асинхронный cached_response: в поток уходит только промах кэша."""
+        key = self.get_cache_key(
+            request, await aget_versions(self.cache_models)
+        )
+        cached = await cache.aget(key)
+        if cached is None:
+            response = await sync_to_async(view_method)(
+                request, *args, **kwargs
+            )
+            cached = self.make_cache_entry(response)
+            if cached is None:
+                return response
+            await cache.aset(key, cached, REFERENCE_CACHE_TIMEOUT)
+        return self.cached_reply(request, *cached)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(
+            super().retrieve, request, *args, **kwargs
+        )
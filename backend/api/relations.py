@@ -0,0 +1,84 @@
+from django.db import connections, router
+
+
+def get_link_sql(model, owner_field, target_field):
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    return (
+        connection,
+        quote(model._meta.db_table),
+        quote(model._meta.get_field(owner_field).column),
+        quote(model._meta.get_field(target_field).column),
+    )
+
+
+def add_links(
+    model, owner_field, owner_id, target_field, target_ids, values=None
+):
+    """
+    Добавляет связи owner -> targets одним INSERT ... ON CONFLICT DO NOTHING.
+
+    values - значения остальных полей связи, одинаковые для всех строк.
+    Возвращает множество target_ids, которые действительно добавлены:
+    уже существующие связи не дают ни ошибки, ни второй строки.
+    """
+    target_ids = list(target_ids)
+    if not target_ids:
+        return set()
+    connection, table, owner, target = get_link_sql(
+        model, owner_field, target_field
+    )
+    values = values or {}
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        [
+            owner,
+            target,
+            *(quote(model._meta.get_field(name).column) for name in values),
+        ]
+    )
+    row = '({})'.format(', '.join(['%s'] * (2 + len(values))))
+    params = []
+    for target_id in target_ids:
+        params += [owner_id, target_id, *values.values()]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'VALUES {", ".join([row] * len(target_ids))} '
+            f'ON CONFLICT DO NOTHING RETURNING {target}',
+            params,
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def remove_links(
+    model, owner_field, owner_id, target_field, target_ids, returning=None
+):
+    """
+    Удаляет связи owner -> targets одним DELETE ... RETURNING.
+
+    Возвращает множество target_ids, связи с которыми были удалены, а при
+    returning - словарь {target_id: значение поля returning}.
+    """
+    target_ids = list(target_ids)
+    if not target_ids:
+        return {} if returning else set()
+    connection, table, owner, target = get_link_sql(
+        model, owner_field, target_field
+    )
+    returned = target
+    if returning:
+        returned += ', ' + connection.ops.quote_name(
+            model._meta.get_field(returning).column
+        )
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {owner} = %s '
+            f'AND {target} IN ({placeholders}) RETURNING {returned}',
+            [owner_id, *target_ids],
+        )
+        rows = cursor.fetchall()
+    if returning:
+        return dict(rows)
+    return {row[0] for row in rows}
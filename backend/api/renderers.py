@@ -1,5 +1,4 @@
 import csv
-import io
 
 from rest_framework import renderers
 
@@ -10,40 +9,84 @@ DATA_FILE_HEADERS = [
 ]
 
 
-class CSVDataRenderer(renderers.BaseRenderer):
+class Echo:
+    """Псевдо-буфер для csv.writer: отдаёт строку вместо записи."""
 
-    media_type = "text/csv"
-    format = "csv"
+    def write(self, value):
+        return value
+
+
+class StreamingDataRenderer(renderers.BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+
+    stream() построчно отдаёт файл для StreamingHttpResponse, astream() -
+    то же для асинхронного итератора строк под ASGI, render() собирает
+    файл целиком для обычного Response. Подклассы задают header() и row().
+    """
+
+    charset = 'utf-8'
+
+    def header(self):
+        return ''
+
+    def row(self, ingredient_data):
+        raise NotImplementedError
+
+    def stream(self, data):
+        yield self.header()
+        for ingredient_data in data:
+            yield self.row(ingredient_data)
+
+    async def astream(self, data):
+        yield self.header()
+        async for ingredient_data in data:
+            yield self.row(ingredient_data)
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ''.join(self.stream(data))
+
 
-        csv_buffer = io.StringIO()
-        csv_writer = csv.DictWriter(
-            csv_buffer, fieldnames=DATA_FILE_HEADERS, extrasaction="ignore"
+class CSVDataRenderer(StreamingDataRenderer):
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def __init__(self):
+        self.writer = csv.DictWriter(
+            Echo(), fieldnames=DATA_FILE_HEADERS, extrasaction="ignore"
         )
-        csv_writer.writeheader()
 
-        for ingredient_data in data:
-            csv_writer.writerow(ingredient_data)
+    def header(self):
+        return self.writer.writeheader()
 
-        return csv_buffer.getvalue()
+    def row(self, ingredient_data):
+        return self.writer.writerow(ingredient_data)
 
 
-class TextDataRenderer(renderers.BaseRenderer):
+class TextDataRenderer(StreamingDataRenderer):
 
     media_type = "text/plain"
     format = "txt"
 
-    def render(self, data, accepted_media_type=None, renderer_context=None):
+    def header(self):
+        return ' '.join(header for header in DATA_FILE_HEADERS) + '\n'
 
-        text_buffer = io.StringIO()
-        text_buffer.write(
-            ' '.join(header for header in DATA_FILE_HEADERS) + '\n'
-        )
+    def row(self, ingredient_data):
+        return ' '.join(
+            str(ingredient_data[header]) for header in DATA_FILE_HEADERS
+        ) + '\n'
+
+
+class MarkdownDataRenderer(StreamingDataRenderer):
 
-        for student_data in data:
-            text_buffer.write(
-                ' '.join(str(sd) for sd in list(student_data.values())) + '\n'
-            )
+    media_type = "text/markdown"
+    format = "md"
 
-        return text_buffer.getvalue()
+    def header(self):
+        return '# Список покупок\n\n'
+
+    def row(self, ingredient_data):
+        return '- [ ] {} — {} {}\n'.format(
+            *(ingredient_data[header] for header in DATA_FILE_HEADERS)
+        )
@@ -1,17 +1,129 @@
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
-from foodgram.settings import MAX_VALUE, MIN_VALUE
+from foodgram.settings import (
+    MAX_SERVINGS,
+    MAX_VALUE,
+    MIN_VALUE,
+    PANTRY_INGREDIENTS_LIMIT,
+    RECIPES_BATCH_LIMIT,
+)
+from recipes.images import get_image_variant
 from recipes.models import (
     Favourite,
     Ingredient,
     IngredientsInRecipe,
     Recipe,
+    ShoppingCartIngredient,
     ShoppingList,
     Tag,
 )
-from users.models import CustomUser
+from recipes.search import update_recipe_search
+from recipes.versions import bump_version
+from users.models import CustomUser, Subscribe
+
+
+def get_subscribed_ids(request):
+    """Id авторов, на которых подписан пользователь, один запрос на request."""
+    if not request.user.is_authenticated:
+        return set()
+    if not hasattr(request, 'subscribed_ids'):
+        request.subscribed_ids = set(
+            Subscribe.objects.filter(user=request.user).values_list(
+                'author_id', flat=True
+            )
+        )
+    return request.subscribed_ids
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Принимает картинку в base64 или файлом, отдаёт ссылку на копию.
+
+    В списках отдаётся карточка, на странице рецепта крупная копия.
+    """
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def get_variant(self):
+        if self.variant is not None:
+            return self.variant
+        view = self.context.get('view')
+        if view is not None and getattr(view, 'action', None) == 'list':
+            return 'card'
+        return 'detail'
+
+    def to_representation(self, value):
+        image = get_image_variant(value, self.get_variant())
+        if not image:
+            return None
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(image.url)
+        return image.url
+
+
+def trim_fields(serializer, names, keep):
+    """
+    Оставляет (keep=True) или убирает поля serializer по списку имён.
+
+    Имена вида author.username относятся к полям вложенного сериализатора.
+    """
+    top = set()
+    nested = {}
+    for name in names:
+        head, _, rest = name.strip().partition('.')
+        if not head:
+            continue
+        if rest:
+            nested.setdefault(head, []).append(rest)
+        else:
+            top.add(head)
+    fields = serializer.fields
+    for name in list(fields):
+        if (name in top) != keep and (not keep or name not in nested):
+            fields.pop(name)
+    for head, rest in nested.items():
+        if head not in fields or keep and head in top:
+            continue
+        child = getattr(fields[head], 'child', fields[head])
+        if hasattr(child, 'fields'):
+            trim_fields(child, rest, keep)
+
+
+class SparseFieldsMixin:
+    """
+    Ответ только с полями из ?fields= или пресета ?view=, без ?omit=.
+
+    Работает для сериализатора верхнего уровня, которому передан request.
+    """
+
+    sparse_presets = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_sparse = False
+        request = self.context.get('request')
+        if request is None:
+            return
+        params = request.query_params
+        selected = params.get('fields')
+        selected = (
+            selected.split(',')
+            if selected
+            else self.sparse_presets.get(params.get('view'))
+        )
+        omitted = params.get('omit')
+        if selected:
+            trim_fields(self, selected, keep=True)
+        if omitted:
+            trim_fields(self, omitted.split(','), keep=False)
+        self.is_sparse = bool(selected or omitted)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -57,9 +169,7 @@ class UserListSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        if self.context['request'].user.is_authenticated:
-            return obj.subscribing.exists()
-        return False
+        return obj.id in get_subscribed_ids(self.context['request'])
 
 
 class CreateUserSerializer(serializers.ModelSerializer):
@@ -108,7 +218,7 @@ class IngredientsInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     ingredients = IngredientsInRecipeSerializer(
         many=True, source='ingredientsinrecipe_set'
@@ -118,7 +228,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     cooking_time = serializers.IntegerField(source='time_to_cook')
     text = serializers.CharField(source='description')
     author = UserListSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -133,21 +243,96 @@ class RecipeSerializer(serializers.ModelSerializer):
             'image',
             'text',
             'cooking_time',
+            'favorites_count',
         )
 
+    sparse_presets = {
+        'card': (
+            'id',
+            'tags',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'name',
+            'image',
+            'cooking_time',
+        ),
+    }
+
     def get_is_favorited(self, obj):
-        if self.context['request'].user.is_authenticated:
-            return obj.favourite_recipe.filter(
-                user=self.context['request'].user
-            ).exists()
-        return 'Доступно только авторизованному пользователю'
+        user = self.context['request'].user
+        if not user.is_authenticated:
+            return 'Доступно только авторизованному пользователю'
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return obj.favourite_recipe.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
-        if self.context['request'].user.is_authenticated:
-            return obj.shopping_recipe.filter(
-                user=self.context['request'].user
-            ).exists()
-        return 'Доступно только авторизованному пользователю'
+        user = self.context['request'].user
+        if not user.is_authenticated:
+            return 'Доступно только авторизованному пользователю'
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return obj.shopping_recipe.filter(user=user).exists()
+
+    def merge_fragment(self, fragment, recipe):
+        """Дополняет общий фрагмент ленты полями текущего пользователя."""
+        request = self.context['request']
+        data = dict(fragment)
+        if fragment['author'] is not None:
+            data['author'] = {
+                **fragment['author'],
+                'is_subscribed': fragment['author']['id']
+                in get_subscribed_ids(request),
+            }
+        if fragment['image']:
+            data['image'] = request.build_absolute_uri(fragment['image'])
+        data['is_favorited'] = self.get_is_favorited(recipe)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(recipe)
+        data['favorites_count'] = recipe.favorites_count
+        return {field: data[field] for field in self.Meta.fields}
+
+
+class RecipeFeedSerializer(RecipeSerializer):
+    """Фрагмент ленты без полей, зависящих от пользователя, и счётчиков."""
+
+    author = UserSerializer(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = tuple(
+            field
+            for field in RecipeSerializer.Meta.fields
+            if field
+            not in ('is_favorited', 'is_in_shopping_cart', 'favorites_count')
+        )
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """Рецепт с тем, насколько его покрывают продукты пользователя."""
+
+    matched = serializers.ReadOnlyField()
+    missing = serializers.ReadOnlyField()
+    coverage = serializers.ReadOnlyField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'matched',
+            'missing',
+            'coverage',
+        )
+
+    sparse_presets = {
+        'card': RecipeSerializer.sparse_presets['card']
+        + ('matched', 'missing', 'coverage'),
+    }
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=PANTRY_INGREDIENTS_LIMIT,
+    )
+    max_missing = serializers.IntegerField(min_value=0, default=0)
 
 
 class IngredientsInRecipeCreate(serializers.ModelSerializer):
@@ -192,6 +377,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 )
             )
         IngredientsInRecipe.objects.bulk_create(ingredient_liist)
+        update_recipe_search([recipe.id])
+        bump_version(IngredientsInRecipe)
 
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
@@ -199,19 +386,84 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """
+        Приводит состав рецепта к ingredients, меняя только отличающиеся
+        строки. Возвращает прежние и новые количества {ingredient_id: amount}.
+        """
+        existing = {
+            row.ingredient_id: row
+            for row in recipe.ingredientsinrecipe_set.only(
+                'id', 'recipe_id', 'ingredient_id', 'amount'
+            )
+        }
+        old_amounts = {
+            ingredient_id: row.amount
+            for ingredient_id, row in existing.items()
+        }
+        new_amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = [
+            row.id
+            for ingredient_id, row in existing.items()
+            if ingredient_id not in new_amounts
+        ]
+        changed = []
+        added = []
+        for ingredient_id, amount in new_amounts.items():
+            row = existing.get(ingredient_id)
+            if row is None:
+                added.append(
+                    IngredientsInRecipe(
+                        recipe=recipe,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                    )
+                )
+            elif row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if removed:
+            # Без post_delete на каждую строку: сброс карточки, поиск и
+            # версия ниже - по разу на правку рецепта.
+            removed_rows = IngredientsInRecipe.objects.filter(id__in=removed)
+            removed_rows._raw_delete(removed_rows.db)
+        if changed:
+            IngredientsInRecipe.objects.bulk_update(changed, ('amount',))
+        if added:
+            IngredientsInRecipe.objects.bulk_create(added)
+        if removed or changed or added:
+            # search_vector пересчитает post_save рецепта в update().
+            bump_version(IngredientsInRecipe)
+        return old_amounts, new_amounts
+
     def update(self, instance, validated_data):
-        instance.ingredientsinrecipe_set.all().delete()
-        ingredients = validated_data.pop('ingredients')
-        self.create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        with transaction.atomic():
+            Recipe.objects.select_for_update().get(pk=instance.pk)
+            if ingredients is not None:
+                old_amounts, new_amounts = self.update_ingredients(
+                    instance, ingredients
+                )
+                if old_amounts != new_amounts:
+                    ShoppingCartIngredient.objects.change_recipe(
+                        instance, old_amounts, new_amounts
+                    )
+            return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags', 'ingredientsinrecipe_set__ingredient'
+        )
         return RecipeSerializer(instance, context=self.context).data
 
 
 class RecipeForSubscribeSerilizer(serializers.ModelSerializer):
     cooking_time = serializers.IntegerField(source='time_to_cook')
-    image = Base64ImageField()
+    image = RecipeImageField(variant='card')
 
     class Meta:
         model = Recipe
@@ -221,7 +473,7 @@ class RecipeForSubscribeSerilizer(serializers.ModelSerializer):
 class SubscribeSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = CustomUser
@@ -238,28 +490,25 @@ class SubscribeSerializer(serializers.ModelSerializer):
         read_only_fields = ('email', 'username')
 
     def get_recipes(self, obj):
-        recipes_limit = self.context['request'].GET.get('recipes_limit')
-        if recipes_limit:
-            recipes = obj.recipes.all()[: int(recipes_limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
         else:
+            recipes_limit = get_recipes_limit(self.context['request'])
             recipes = obj.recipes.all()
+            if recipes_limit:
+                recipes = recipes[:recipes_limit]
         return RecipeForSubscribeSerilizer(
             recipes, many=True, read_only=True
         ).data
 
     def get_is_subscribed(self, obj):
-        if self.context['request'].user.is_authenticated:
-            return obj.subscribing.exists()
-        return False
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.id in get_subscribed_ids(self.context['request'])
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
     cooking_time = serializers.IntegerField(source='time_to_cook')
     name = serializers.CharField()
-    image = Base64ImageField()
+    image = RecipeImageField(variant='card')
 
     class Meta:
         model = Favourite
@@ -269,8 +518,46 @@ class FavoriteSerializer(serializers.ModelSerializer):
 class ShoppingListSerializer(serializers.ModelSerializer):
     cooking_time = serializers.IntegerField(source='time_to_cook')
     name = serializers.CharField()
-    image = Base64ImageField()
+    image = RecipeImageField(variant='card')
 
     class Meta:
         model = ShoppingList
         fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPES_BATCH_LIMIT,
+    )
+
+    def validate_recipes(self, value):
+        recipe_ids = list(dict.fromkeys(value))
+        missing = set(recipe_ids) - set(
+            Recipe.objects.filter(id__in=recipe_ids).values_list(
+                'id', flat=True
+            )
+        )
+        if missing:
+            raise serializers.ValidationError(
+                f'Рецепты не найдены: {", ".join(map(str, sorted(missing)))}'
+            )
+        return recipe_ids
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=1, required=False)
+
+
+def get_recipes_limit(request):
+    """Проверенный ?recipes_limit или None; неверное значение — 400."""
+    params = RecipesLimitSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return params.validated_data.get('recipes_limit')
+
+
+class ServingsSerializer(serializers.Serializer):
+    servings = serializers.IntegerField(
+        min_value=MIN_VALUE, max_value=MAX_SERVINGS, default=1
+    )
@@ -0,0 +1,55 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, IngredientsInRecipe, Recipe, Tag
+from users.models import CustomUser
+
+from . import feed
+
+
+@receiver((post_save, post_delete), sender=IngredientsInRecipe)
+def invalidate_ingredients_fragment(instance, **kwargs):
+    feed.invalidate([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_tags_fragment(instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # После очистки тега pk_set пуст, рецепты известны только до неё.
+        feed.invalidate(Recipe.objects.filter(tags=instance).values('id'))
+    if action.startswith('pre_'):
+        return
+    if not reverse:
+        feed.invalidate([instance.id])
+    elif pk_set:
+        feed.invalidate(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag_fragments(instance, **kwargs):
+    # pre_delete: связи с рецептами удаляются каскадом без m2m_changed.
+    feed.invalidate(Recipe.objects.filter(tags=instance).values('id'))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_fragments(instance, created, **kwargs):
+    # Удаление ингредиента сбрасывает карточки через IngredientsInRecipe.
+    if not created:
+        feed.invalidate(
+            IngredientsInRecipe.objects.filter(ingredient=instance).values(
+                'recipe_id'
+            )
+        )
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_author_fragments(instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    feed.invalidate(instance.recipes.values('id'))
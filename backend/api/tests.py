@@ -0,0 +1,340 @@
+import io
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import (
+    Favourite,
+    Ingredient,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingList,
+    Tag,
+)
+from recipes.pantry import pantry_index
+from recipes.versions import get_version
+from users.models import CustomUser, Subscribe
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass'
+    )
+
+
+def create_recipes(author, count, tags, ingredients):
+    recipes = [
+        Recipe.objects.create(
+            name=f'Рецепт {author.username} {number}',
+            description='Описание',
+            time_to_cook=10,
+            author=author,
+        )
+        for number in range(count)
+    ]
+    IngredientsInRecipe.objects.bulk_create(
+        IngredientsInRecipe(recipe=recipe, ingredient=ingredient, amount=2)
+        for recipe in recipes
+        for ingredient in ingredients
+    )
+    for recipe in recipes:
+        recipe.tags.set(tags)
+    return recipes
+
+
+class RecipeDataTestCase(APITestCase):
+    """Теги, ингредиенты, три автора с рецептами и читатель с подписками."""
+
+    RECIPES_PER_AUTHOR = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', color='#00ff00', slug=f'tag{number}')
+            for number in range(3)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Продукт {number}', measurement_unit='г')
+            for number in range(3)
+        )
+        cls.authors = [create_user(f'author{number}') for number in range(3)]
+        recipes = [
+            recipe
+            for author in cls.authors
+            for recipe in create_recipes(
+                author, cls.RECIPES_PER_AUTHOR, tags, ingredients
+            )
+        ]
+        cls.recipe = recipes[0]
+        Favourite.objects.bulk_create(
+            Favourite(user=cls.user, recipe=recipe) for recipe in recipes[::2]
+        )
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user=cls.user, recipe=recipe)
+            for recipe in recipes[1::2]
+        )
+        Subscribe.objects.bulk_create(
+            Subscribe(user=cls.user, author=author) for author in cls.authors
+        )
+
+
+class QueryBudgetTests(RecipeDataTestCase):
+    """
+    Число запросов к БД на горячих эндпоинтах не зависит от числа рецептов
+    и авторов на странице: N+1 в сериализаторах ломает эти тесты.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def assertQueryBudget(self, url, budget):
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_recipe_list(self):
+        response = self.assertQueryBudget('/api/recipes/?limit=6', 8)
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_recipe_list_does_not_grow_with_page(self):
+        response = self.assertQueryBudget('/api/recipes/?limit=12', 8)
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_recipe_list_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertQueryBudget('/api/recipes/?limit=6', 7)
+
+    def test_recipe_detail(self):
+        response = self.assertQueryBudget(
+            f'/api/recipes/{self.recipe.id}/', 5
+        )
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+    def test_subscriptions(self):
+        response = self.assertQueryBudget(
+            '/api/users/subscriptions/?limit=3&recipes_limit=2', 4
+        )
+        self.assertEqual(len(response.data['results']), 3)
+        for author in response.data['results']:
+            self.assertEqual(len(author['recipes']), 2)
+            self.assertEqual(
+                author['recipes_count'], self.RECIPES_PER_AUTHOR
+            )
+
+    def test_subscriptions_invalid_recipes_limit(self):
+        for value in ('abc', '0', '-1'):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    f'/api/users/subscriptions/?recipes_limit={value}'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+
+
+class RecipeUpdateTests(RecipeDataTestCase):
+    """
+    Правка рецепта пишет только отличающиеся строки IngredientsInRecipe,
+    остальные сохраняют id.
+    """
+
+    WRITES = tuple(
+        f'{statement} "recipes_ingredientsinrecipe"'
+        for statement in ('INSERT INTO', 'UPDATE', 'DELETE FROM')
+    )
+
+    def setUp(self):
+        self.client.force_authenticate(self.recipe.author)
+        self.rows = self.get_rows()
+        self.amounts = dict.fromkeys(self.rows, 2)
+
+    def get_rows(self):
+        return dict(
+            self.recipe.ingredientsinrecipe_set.values_list(
+                'ingredient_id', 'id'
+            )
+        )
+
+    def patch(self, data, budget, bumps=0):
+        """
+        PATCH рецепта: число запросов, записи в recipes_recipe и версии
+        IngredientsInRecipe, возвращает SQL записи строк состава.
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.patch(
+                    f'/api/recipes/{self.recipe.id}/', data, format='json'
+                )
+        self.assertEqual(response.status_code, 200, response.content)
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(len(statements), budget, '\n'.join(statements))
+        # Сохранение рецепта с новой версией карточки и search_vector.
+        self.assertEqual(
+            len(
+                [
+                    sql
+                    for sql in statements
+                    if sql.startswith('UPDATE "recipes_recipe"')
+                ]
+            ),
+            2,
+        )
+        self.assertEqual(len(callbacks), bumps)
+        return [sql for sql in statements if sql.startswith(self.WRITES)]
+
+    def patch_ingredients(self, amounts, budget, bumps=1):
+        return self.patch(
+            {
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': amount}
+                    for ingredient_id, amount in amounts.items()
+                ]
+            },
+            budget,
+            bumps,
+        )
+
+    def test_name_only(self):
+        self.assertEqual(self.patch({'name': 'Новое название'}, 13), [])
+        self.assertEqual(self.get_rows(), self.rows)
+
+    def test_same_ingredients(self):
+        self.assertEqual(self.patch_ingredients(self.amounts, 17, bumps=0), [])
+        self.assertEqual(self.get_rows(), self.rows)
+
+    def test_change_one_amount(self):
+        changed = next(iter(self.rows))
+        self.amounts[changed] = 5
+        writes = self.patch_ingredients(self.amounts, 19)
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('UPDATE'))
+        self.assertEqual(self.get_rows(), self.rows)
+        self.assertEqual(
+            IngredientsInRecipe.objects.get(id=self.rows[changed]).amount, 5
+        )
+
+    def test_remove_one_ingredient(self):
+        removed = next(iter(self.rows))
+        del self.amounts[removed]
+        writes = self.patch_ingredients(self.amounts, 18)
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('DELETE'))
+        del self.rows[removed]
+        self.assertEqual(self.get_rows(), self.rows)
+
+    def test_add_one_ingredient(self):
+        added = Ingredient.objects.create(name='Новый', measurement_unit='г')
+        self.amounts[added.id] = 3
+        writes = self.patch_ingredients(self.amounts, 20)
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('INSERT'))
+        rows = self.get_rows()
+        del rows[added.id]
+        self.assertEqual(rows, self.rows)
+
+
+class PantryTests(RecipeDataTestCase):
+    """Ранжированный в памяти список pantry делится по номерам страниц."""
+
+    def setUp(self):
+        pantry_index.build(get_version(IngredientsInRecipe))
+        ingredients = self.recipe.ingredientsinrecipe_set.values_list(
+            'ingredient_id', flat=True
+        )
+        self.url = (
+            '/api/recipes/pantry/?limit=5&ingredients='
+            + ','.join(map(str, ingredients))
+        )
+
+    def test_page_number(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['count'], 12)
+
+    def test_cursor_falls_back_to_page_number(self):
+        response = self.client.get(f'{self.url}&pagination=cursor')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['count'], 12)
+        self.assertIn('page=2', response.data['next'])
+
+
+class FeedCacheTests(RecipeDataTestCase):
+    """Фрагменты карточек в кэше не переживают правку рецепта."""
+
+    def setUp(self):
+        cache.clear()
+        self.recipe.refresh_from_db()
+
+    def get_card(self, recipe):
+        response = self.client.get('/api/recipes/?limit=12')
+        return next(
+            card
+            for card in response.data['results']
+            if card['id'] == recipe.id
+        )
+
+    def test_edit_replaces_cached_fragment(self):
+        self.get_card(self.recipe)
+        self.recipe.name = 'Новое название'
+        self.recipe.save()
+        self.assertEqual(self.get_card(self.recipe)['name'], 'Новое название')
+
+    def test_tag_rename_replaces_cached_fragment(self):
+        self.get_card(self.recipe)
+        tag = self.recipe.tags.first()
+        tag.name = 'Новый тег'
+        tag.save()
+        tags = self.get_card(self.recipe)['tags']
+        self.assertIn('Новый тег', [card_tag['name'] for card_tag in tags])
+
+    def test_ingredient_rename_bumps_recipe_version(self):
+        version = self.recipe.version
+        ingredient = self.recipe.ingredients.first()
+        ingredient.name = 'Новый продукт'
+        ingredient.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.version, version + 1)
+
+    def test_stale_copy_does_not_roll_version_back(self):
+        version = self.recipe.version
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.recipe.save()
+        stale.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.version, version + 2)
+
+    def test_rollback_keeps_version(self):
+        version = self.recipe.version
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.recipe.save()
+            raise RuntimeError
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.version, version)
+
+
+class ExplainPlanTests(RecipeDataTestCase):
+    """Запросы горячих эндпоинтов используют индексы, а не Seq Scan."""
+
+    def test_hot_queries_use_indexes(self):
+        output = io.StringIO()
+        try:
+            call_command(
+                'explain_api_queries', user=self.user.id, stdout=output
+            )
+        except CommandError as error:
+            self.fail(f'{error}\n{output.getvalue()}')
+
+    def test_application_cache_is_untouched(self):
+        cache.set('explain:sentinel', 1)
+        call_command(
+            'explain_api_queries', user=self.user.id, stdout=io.StringIO()
+        )
+        self.assertEqual(cache.get('explain:sentinel'), 1)
@@ -11,6 +11,9 @@ router.register(r'users', views.UserViewSet, basename='users')
 router.register(
     r'ingredients', views.IngredientViewSet, basename='ingredients'
 )
+router.register(
+    r'profiler', views.ProfilerStatsViewSet, basename='profiler'
+)
 
 urlpatterns = [
     path('', include(router.urls)),
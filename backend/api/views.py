@@ -1,63 +1,193 @@
-from django.db.models import F, Sum
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Sum, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.permissions import (AllowAny, IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from recipes.models import (Favourite, Ingredient, IngredientsInRecipe, Recipe,
-                            ShoppingList, Tag)
+from foodgram import profiling
+from foodgram.settings import INGREDIENTS_AUTOCOMPLETE_LIMIT
+from recipes.autocomplete import autocomplete
+from recipes.counters import change_counter
+from recipes.models import (Favourite, Ingredient, Recipe,
+                            ShoppingCartIngredient, ShoppingList, Tag)
+from recipes.pantry import pantry_index
+from recipes.units import base_unit, unit_factor
 from users.models import CustomUser, Subscribe
 
+from . import feed
 from .filters import RecipeFilter
+from .mixins import AsyncViewSetMixin, CachedReferenceMixin
 from .permissions import IsAuthorOrReadOnly
-from .renderers import CSVDataRenderer, TextDataRenderer
+from .relations import add_links, remove_links
+from .renderers import CSVDataRenderer, MarkdownDataRenderer, TextDataRenderer
 from .serializers import (CreateUserSerializer, FavoriteSerializer,
-                          IngredientSerializer, PasswordChangeSerializer,
-                          RecipeCreateSerializer, RecipeSerializer,
-                          ShoppingListSerializer, SubscribeSerializer,
-                          TagSerializer, UserListSerializer, UserSerializer)
+                          IngredientSerializer, PantryRecipeSerializer,
+                          PantrySerializer, PasswordChangeSerializer,
+                          RecipeCreateSerializer, RecipeFeedSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
+                          ServingsSerializer, ShoppingListSerializer,
+                          SubscribeSerializer, TagSerializer,
+                          UserListSerializer, UserSerializer,
+                          get_recipes_limit)
+
+SHOPPING_CART_CHUNK_SIZE = 2000
 
 
 class IngredientViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    AsyncViewSetMixin,
+    CachedReferenceMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (SearchFilter,)
-    search_fields = ['^name']
+    cache_models = (Ingredient,)
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get(api_settings.SEARCH_PARAM):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(self.search, request)
+
+    async def alist(self, request, *args, **kwargs):
+        if not request.query_params.get(api_settings.SEARCH_PARAM):
+            return await super().alist(request, *args, **kwargs)
+        return await self.acached_response(self.search, request)
+
+    def search(self, request):
+        return Response(
+            autocomplete(
+                request.query_params[api_settings.SEARCH_PARAM],
+                INGREDIENTS_AUTOCOMPLETE_LIMIT,
+            )
+        )
 
 
 class TagViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    AsyncViewSetMixin,
+    CachedReferenceMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    cache_models = (Tag,)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncViewSetMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    cursor_ordering = ('-pub_date', '-id')
+
+    def get_sparse_fields(self):
+        """Поля ответа, если клиент запросил ?fields=, ?omit= или ?view=."""
+        if self.action not in ('list', 'retrieve', 'pantry'):
+            return None
+        serializer = self.get_serializer()
+        return serializer.fields if serializer.is_sparse else None
 
     def get_queryset(self):
-        return Recipe.objects.prefetch_related(
-            'ingredientsinrecipe_set__ingredient', 'tags'
-        ).all()
+        fields = self.get_sparse_fields()
+        requested = RecipeSerializer.Meta.fields if fields is None else fields
+        queryset = Recipe.objects.all()
+        if fields is not None:
+            columns = {field.source for field in fields.values()} & {
+                field.name for field in Recipe._meta.concrete_fields
+            }
+            queryset = queryset.only('id', 'pub_date', *columns)
+        if 'author' in requested:
+            queryset = queryset.select_related('author')
+        if 'ingredients' in requested:
+            queryset = queryset.prefetch_related(
+                'ingredientsinrecipe_set__ingredient'
+            )
+        if 'tags' in requested:
+            queryset = queryset.prefetch_related('tags')
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        if 'is_favorited' in requested:
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favourite.objects.filter(user=user, recipe=OuterRef('pk'))
+                )
+            )
+        if 'is_in_shopping_cart' in requested:
+            queryset = queryset.annotate(
+                is_in_shopping_cart=Exists(
+                    ShoppingList.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                )
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if self.get_sparse_fields() is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .select_related(None)
+            .prefetch_related(None)
+            .only('id', 'pub_date', 'favorites_count', 'version')
+        )
+        page = self.paginate_queryset(queryset)
+        recipes = list(queryset) if page is None else page
+        data, hits, misses, duration = feed.assemble(
+            recipes, self.get_serializer(), self.build_feed_fragments
+        )
+        if page is None:
+            response = Response(data)
+        else:
+            response = self.get_paginated_response(data)
+        response['X-Feed-Cache'] = f'hits={hits}; misses={misses}'
+        response['Server-Timing'] = f'feed;dur={duration * 1000:.2f}'
+        return response
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """
+        Рецепт читается асинхронным ORM, сериализация остаётся в потоке:
+        вложенные сериализаторы могут обращаться к БД синхронно.
+        """
+        try:
+            recipe = await self.get_queryset().aget(pk=kwargs['pk'])
+        except (Recipe.DoesNotExist, TypeError, ValueError):
+            raise Http404
+        self.check_object_permissions(request, recipe)
+        serializer = self.get_serializer(recipe)
+        return Response(await sync_to_async(getattr)(serializer, 'data'))
+
+    def build_feed_fragments(self, recipe_ids):
+        return RecipeFeedSerializer(
+            self.get_queryset().filter(id__in=recipe_ids),
+            many=True,
+            context={'view': self},
+        ).data
 
     def get_serializer_class(self):
-        if self.action == 'shopping_cart':
+        if self.action in ('shopping_cart', 'shopping_cart_batch'):
             return ShoppingListSerializer
-        if self.action == 'favorite':
+        if self.action in ('favorite', 'favorite_batch'):
             return FavoriteSerializer
+        if self.action == 'pantry':
+            return PantryRecipeSerializer
         if self.action in ('create', 'update', 'delete', 'partial_update'):
             return RecipeCreateSerializer
         return RecipeSerializer
@@ -65,62 +195,273 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    @action(detail=True, methods=['POST', 'DELETE'])
-    def favorite(self, request, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
-        if request.method == 'DELETE':
-            get_object_or_404(
-                Favourite, user=request.user, recipe=recipe
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+    def perform_destroy(self, instance):
+        # Агрегат корзин правит pre_delete рецепта.
+        instance.delete()
+
+    @staticmethod
+    def get_servings(request):
+        serializer = ServingsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['servings']
+
+    def link_recipes(self, request, model, recipe_ids):
+        if model is not ShoppingList:
+            added = add_links(
+                model, 'user', request.user.id, 'recipe', recipe_ids
+            )
+            change_counter(model, added, 1)
+            return added
+        servings = self.get_servings(request)
+        added = add_links(
+            model,
+            'user',
+            request.user.id,
+            'recipe',
+            recipe_ids,
+            values={'servings': servings},
+        )
+        change_counter(model, added, 1)
+        if added:
+            ShoppingCartIngredient.objects.add_recipes(
+                request.user.id, added, servings
+            )
+        return added
+
+    def unlink_recipes(self, request, model, recipe_ids):
+        if model is not ShoppingList:
+            removed = remove_links(
+                model, 'user', request.user.id, 'recipe', recipe_ids
+            )
+            change_counter(model, removed, -1)
+            return removed
+        removed = remove_links(
+            model,
+            'user',
+            request.user.id,
+            'recipe',
+            recipe_ids,
+            returning='servings',
+        )
+        change_counter(model, removed, -1)
+        if removed:
+            ShoppingCartIngredient.objects.remove_recipes(
+                request.user.id, removed
+            )
+        return removed
+
+    def change_servings(self, request, pk):
+        servings = self.get_servings(request)
+        with transaction.atomic():
+            entry = get_object_or_404(
+                ShoppingList.objects.select_for_update().select_related(
+                    'recipe'
+                ),
+                user=request.user,
+                recipe_id=pk,
+            )
+            if entry.servings != servings:
+                ShoppingCartIngredient.objects.change_servings(
+                    request.user, entry.recipe, entry.servings, servings
+                )
+                entry.servings = servings
+                # Без post_save: агрегат уже сдвинут на разницу порций.
+                ShoppingList.objects.filter(pk=entry.pk).update(
+                    servings=servings
+                )
+        serializer = self.get_serializer(entry.recipe)
+        return Response(serializer.data)
+
+    def toggle_recipe(self, request, model, pk, place):
+        """
+        Добавление (201) или удаление (204) рецепта одной записью в БД.
+
+        Повторное добавление и удаление отсутствующего рецепта дают 400.
+        """
+        with transaction.atomic():
+            if request.method == 'DELETE':
+                if self.unlink_recipes(request, model, [int(pk)]):
+                    return Response(status=status.HTTP_204_NO_CONTENT)
+                get_object_or_404(Recipe, id=pk)
+                return Response(
+                    {'errors': f'Рецепта нет в {place}'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            recipe = get_object_or_404(Recipe, id=pk)
+            if not self.link_recipes(request, model, [recipe.id]):
+                return Response(
+                    {'errors': f'Рецепт уже в {place}'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
         serializer = self.get_serializer(recipe)
-        Favourite.objects.create(user=request.user, recipe=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def toggle_recipes(self, request, model):
+        """
+        Пакетное добавление или удаление рецептов {"recipes": [id, ...]}.
+
+        Повторы не считаются ошибкой: POST отдаёт только добавленные
+        рецепты, DELETE всегда отвечает 204.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        with transaction.atomic():
+            if request.method == 'DELETE':
+                self.unlink_recipes(request, model, recipe_ids)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            added = self.link_recipes(request, model, recipe_ids)
+        serializer = self.get_serializer(
+            Recipe.objects.filter(id__in=added), many=True
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['POST', 'DELETE'])
+    def favorite(self, request, **kwargs):
+        return self.toggle_recipe(
+            request, Favourite, kwargs['pk'], 'избранном'
+        )
+
     @action(
         detail=True,
-        methods=['POST', 'DELETE'],
+        methods=['POST', 'PATCH', 'DELETE'],
     )
     def shopping_cart(self, request, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
-        if request.method == 'DELETE':
-            get_object_or_404(
-                ShoppingList, user=request.user, recipe=recipe
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        serializer = self.get_serializer(recipe)
-        ShoppingList.objects.create(user=request.user, recipe=recipe)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if request.method == 'PATCH':
+            return self.change_servings(request, kwargs['pk'])
+        return self.toggle_recipe(
+            request, ShoppingList, kwargs['pk'], 'списке покупок'
+        )
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=[
+            IsAuthenticated,
+        ],
+    )
+    def favorite_batch(self, request):
+        return self.toggle_recipes(request, Favourite)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=[
+            IsAuthenticated,
+        ],
+    )
+    def shopping_cart_batch(self, request):
+        return self.toggle_recipes(request, ShoppingList)
+
+    @action(detail=False)
+    def pantry(self, request):
+        """
+        Рецепты из имеющихся продуктов: ?ingredients=1,2,3&max_missing=1.
+
+        Сначала рецепты с наибольшей долей имеющихся ингредиентов.
+        """
+        params = PantrySerializer(
+            data={
+                'ingredients': [
+                    ingredient_id
+                    for value in request.query_params.getlist('ingredients')
+                    for ingredient_id in value.split(',')
+                    if ingredient_id
+                ],
+                'max_missing': request.query_params.get('max_missing', 0),
+            }
+        )
+        params.is_valid(raise_exception=True)
+        matches = pantry_index.match(
+            params.validated_data['ingredients'],
+            params.validated_data['max_missing'],
+        )
+        filtered = self.filter_queryset(Recipe.objects.all())
+        if filtered.query.where:
+            allowed = set(
+                filtered.filter(
+                    id__in=[match.recipe_id for match in matches]
+                ).values_list('id', flat=True)
+            )
+            matches = [
+                match for match in matches if match.recipe_id in allowed
+            ]
+        page = self.paginate_queryset(matches)
+        if page is not None:
+            matches = page
+        recipes = self.get_queryset().in_bulk(
+            [match.recipe_id for match in matches]
+        )
+        results = []
+        for match in matches:
+            recipe = recipes.get(match.recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched = match.matched
+            recipe.missing = match.required - match.matched
+            recipe.coverage = match.matched / match.required
+            results.append(recipe)
+        serializer = self.get_serializer(results, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
     @action(
         detail=False,
         permission_classes=[
             IsAuthenticated,
         ],
-        renderer_classes=[CSVDataRenderer, TextDataRenderer],
+        renderer_classes=[
+            CSVDataRenderer,
+            TextDataRenderer,
+            MarkdownDataRenderer,
+        ],
     )
     def download_shopping_cart(self, request):
-        ingredients = (
-            IngredientsInRecipe.objects.filter(
-                recipe__shopping_recipe__user=request.user
+        return self.shopping_cart_response(
+            request.accepted_renderer.stream(
+                self.shopping_cart_ingredients(request.user).iterator(
+                    chunk_size=SHOPPING_CART_CHUNK_SIZE
+                )
             )
-            .values(
-                'ingredient__name',
-                'ingredient__measurement_unit',
+        )
+
+    async def adownload_shopping_cart(self, request):
+        """Под ASGI файл идёт из aiterator() без буферизации ответа."""
+        return self.shopping_cart_response(
+            request.accepted_renderer.astream(
+                self.shopping_cart_ingredients(request.user).aiterator(
+                    chunk_size=SHOPPING_CART_CHUNK_SIZE
+                )
             )
-            .annotate(
+        )
+
+    @staticmethod
+    def shopping_cart_ingredients(user):
+        unit = 'ingredient__measurement_unit'
+        return (
+            ShoppingCartIngredient.objects.filter(user=user)
+            .values(
                 Ингредиент=F('ingredient__name'),
-                Количество=Sum('amount'),
-                Единицы_измерения=F('ingredient__measurement_unit'),
+                Единицы_измерения=base_unit(unit),
             )
+            .annotate(Количество=Sum(F('amount') * unit_factor(unit)))
+            .order_by('Ингредиент', 'Единицы_измерения')
         )
-        file_name = f'your_shopping_list.{request.accepted_renderer.format}'
-        return Response(
-            ingredients,
-            headers={
-                "Content-Disposition": f'attachment; filename="{file_name}"'
-            },
+
+    def shopping_cart_response(self, content):
+        renderer = self.request.accepted_renderer
+        file_name = f'your_shopping_list.{renderer.format}'
+        response = StreamingHttpResponse(
+            content,
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
         )
+        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+        return response
 
 
 class UserViewSet(
@@ -130,6 +471,7 @@ class UserViewSet(
     viewsets.GenericViewSet,
 ):
     queryset = CustomUser.objects.all()
+    cursor_ordering = ('id',)
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -175,8 +517,24 @@ class UserViewSet(
         ],
     )
     def subscriptions(self, request):
-        queryset = CustomUser.objects.filter(
-            subscribing__user=self.request.user
+        recipes = Recipe.objects.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        )
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit:
+            recipes = recipes.filter(row_number__lte=recipes_limit)
+        queryset = (
+            CustomUser.objects.filter(subscribing__user=self.request.user)
+            .order_by('id')
+            .prefetch_related(
+                Prefetch(
+                    'recipes', queryset=recipes, to_attr='limited_recipes'
+                )
+            )
         )
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -193,15 +551,66 @@ class UserViewSet(
         ],
     )
     def subscribe(self, request, **kwargs):
-        author = get_object_or_404(CustomUser, id=kwargs['pk'])
+        pk = int(kwargs['pk'])
         if request.method == 'DELETE':
-            get_object_or_404(
-                Subscribe, user=request.user, author=author
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            with transaction.atomic():
+                removed = remove_links(
+                    Subscribe, 'user', request.user.id, 'author', [pk]
+                )
+                change_counter(Subscribe, removed, -1)
+            if removed:
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            get_object_or_404(CustomUser, id=pk)
+            return Response(
+                {'errors': 'Вы не подписаны на этого автора'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        author = get_object_or_404(CustomUser, id=pk)
+        if author == request.user:
+            return Response(
+                {'errors': 'Нельзя подписаться на самого себя'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         serializer = SubscribeSerializer(
             author, data=request.data, context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        Subscribe.objects.create(user=request.user, author=author)
+        with transaction.atomic():
+            added = add_links(
+                Subscribe, 'user', request.user.id, 'author', [pk]
+            )
+            change_counter(Subscribe, added, 1)
+        if not added:
+            return Response(
+                {'errors': 'Вы уже подписаны на этого автора'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ProfilerStatsViewSet(viewsets.ViewSet):
+    """Статистика профилировщика запросов текущего процесса."""
+
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response(
+            {
+                'since': datetime.fromtimestamp(
+                    profiling.stats.started, tz=timezone.utc
+                ),
+                'views': profiling.stats.snapshot(),
+                'feed_cache': {
+                    'requests': feed.stats.requests,
+                    'hits': feed.stats.hits,
+                    'misses': feed.stats.misses,
+                    'hit_ratio': feed.stats.hit_ratio,
+                    'assembly_ms': feed.stats.assembly_time * 1000,
+                },
+            }
+        )
+
+    @action(methods=['POST'], detail=False)
+    def reset(self, request):
+        profiling.stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,38 @@
+from django.core.exceptions import ImproperlyConfigured
+
+POOLED_ENGINE = 'foodgram.pooled_postgresql'
+CONNECTION_PROFILES = ('direct', 'persistent', 'pool')
+
+
+def database_settings(
+    database, profile, conn_max_age, pool_options, pgbouncer=False
+):
+    """
+    Настройки DATABASES для профиля соединений.
+
+    direct - новое соединение на каждый HTTP-запрос;
+    persistent - соединение живёт conn_max_age секунд и проверяется
+    перед первым запросом в каждом HTTP-запросе;
+    pool - пул psycopg_pool на процесс, соединение с проверкой берётся
+    из пула на время HTTP-запроса.
+    pgbouncer отключает server-side курсоры и prepared statements, чтобы
+    работать через PgBouncer в режиме pool_mode = transaction.
+    """
+    if profile not in CONNECTION_PROFILES:
+        raise ImproperlyConfigured(
+            f'Неизвестный профиль соединений {profile}, '
+            f'допустимы: {", ".join(CONNECTION_PROFILES)}'
+        )
+    database = {**database, 'OPTIONS': {**database.get('OPTIONS', {})}}
+    if profile == 'persistent':
+        database['CONN_MAX_AGE'] = conn_max_age
+        database['CONN_HEALTH_CHECKS'] = True
+    elif profile == 'pool':
+        database['ENGINE'] = POOLED_ENGINE
+        database['CONN_MAX_AGE'] = 0
+        database['CONN_HEALTH_CHECKS'] = True
+        database['OPTIONS']['pool'] = pool_options
+    if pgbouncer:
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        database['OPTIONS']['prepare_threshold'] = None
+    return database
@@ -0,0 +1,98 @@
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import (
+    IsolationLevel,
+    is_psycopg3,
+)
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с пулом соединений psycopg_pool на процесс.
+
+    Django 4.2 не умеет пулы (они появились в 5.1), поэтому соединение
+    берётся из пула вместо connect() и возвращается в пул вместо close().
+    Параметры пула - OPTIONS['pool'] (min_size, max_size, timeout и т.д.),
+    CONN_HEALTH_CHECKS включает проверку соединения при выдаче из пула.
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def check_settings(self):
+        super().check_settings()
+        if not is_psycopg3 or ConnectionPool is None:
+            raise ImproperlyConfigured(
+                'Пулу соединений нужны пакеты psycopg и psycopg-pool'
+            )
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured(
+                'Пул соединений несовместим с CONN_MAX_AGE, задайте 0'
+            )
+
+    @property
+    def pool(self):
+        pool = self._pools.get(self.alias)
+        if pool is not None:
+            return pool
+        with self._pools_lock:
+            if self.alias not in self._pools:
+                options = self.settings_dict['OPTIONS'].get('pool', {})
+                self._pools[self.alias] = ConnectionPool(
+                    kwargs={
+                        **self.get_connection_params(),
+                        'autocommit': True,
+                    },
+                    check=(
+                        ConnectionPool.check_connection
+                        if self.settings_dict['CONN_HEALTH_CHECKS']
+                        else None
+                    ),
+                    name=self.alias,
+                    open=True,
+                    **options,
+                )
+        return self._pools[self.alias]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        try:
+            self.isolation_level = IsolationLevel(
+                isolation_level
+                if isolation_level is not None
+                else IsolationLevel.READ_COMMITTED
+            )
+        except ValueError:
+            raise ImproperlyConfigured(
+                f'Неизвестный уровень изоляции {isolation_level}'
+            )
+        connection = self.pool.getconn()
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            self.pool.putconn(self.connection)
+        self.connection = None
+
+    def close_pool(self):
+        self.close()
+        with self._pools_lock:
+            pool = self._pools.pop(self.alias, None)
+        if pool is not None:
+            pool.close()
@@ -0,0 +1,307 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+from foodgram.settings import (
+    PROFILER_DUPLICATE_THRESHOLD,
+    PROFILER_ENABLED,
+    PROFILER_SLOW_REQUEST_MS,
+    PROFILER_SLOW_SAMPLE_RATE,
+)
+
+logger = logging.getLogger(__name__)
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    """Запросы к БД и время одного HTTP-запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.signatures = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.signatures[sql] = self.signatures.get(sql, 0) + 1
+
+    @property
+    def duplicates(self):
+        """Одинаковые запросы, повторённые не меньше порога раз (N+1)."""
+        return {
+            sql: count
+            for sql, count in self.signatures.items()
+            if count >= PROFILER_DUPLICATE_THRESHOLD
+        }
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.queries = 0
+        self.duplicate_requests = 0
+
+    def add(self, profile, duration):
+        self.requests += 1
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.db_time += profile.db_time
+        self.serializer_time += profile.serializer_time
+        self.queries += profile.queries
+        self.duplicate_requests += bool(profile.duplicates)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'avg_ms': self.total_time / self.requests * 1000,
+            'max_ms': self.max_time * 1000,
+            'avg_db_ms': self.db_time / self.requests * 1000,
+            'avg_serializer_ms': self.serializer_time / self.requests * 1000,
+            'avg_queries': self.queries / self.requests,
+            'duplicate_requests': self.duplicate_requests,
+        }
+
+
+class ProfilerStats:
+    """Накопленная статистика по view в пределах процесса."""
+
+    def __init__(self):
+        self.views = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def add(self, profile, duration):
+        with self.lock:
+            stats = self.views.get(profile.view_name)
+            if stats is None:
+                stats = self.views[profile.view_name] = ViewStats()
+            stats.add(profile, duration)
+
+    def snapshot(self):
+        with self.lock:
+            views = {
+                name: stats.as_dict() for name, stats in self.views.items()
+            }
+        return dict(
+            sorted(
+                views.items(),
+                key=lambda item: item[1]['avg_ms'] * item[1]['requests'],
+                reverse=True,
+            )
+        )
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.started = time.time()
+
+
+stats = ProfilerStats()
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Передаёт запрос профилю текущего HTTP-запроса, если он есть."""
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install_execute_wrapper(connection, **kwargs):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def instrument_connections():
+    """
+    Обёртка ставится на каждое соединение, а профиль берётся из контекста.
+
+    Соединения у Django свои в каждом потоке, а под ASGI синхронный код
+    запроса выполняется в потоках sync_to_async, куда контекст копируется.
+    """
+    connection_created.connect(install_execute_wrapper)
+    for connection in connections.all(initialized_only=True):
+        install_execute_wrapper(connection)
+
+
+def get_view_name(view_func, method):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def profile_serializer_data(prop):
+    """Время вычисления serializer.data верхнего уровня."""
+
+    def data(self):
+        profile = current_profile.get()
+        if profile is None:
+            return prop.fget(self)
+        profile.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return prop.fget(self)
+        finally:
+            profile.serializer_depth -= 1
+            if not profile.serializer_depth:
+                profile.serializer_time += time.perf_counter() - started
+
+    return property(data)
+
+
+def instrument_serializers():
+    for serializer_class in (
+        serializers.Serializer,
+        serializers.ListSerializer,
+    ):
+        if not getattr(serializer_class.data.fget, 'profiled', False):
+            serializer_class.data = profile_serializer_data(
+                serializer_class.data
+            )
+            serializer_class.data.fget.profiled = True
+
+
+class QueryProfilerMiddleware:
+    """
+    Считает запросы к БД, их время и время сериализации для каждого запроса.
+
+    Итоги уходят в заголовок Server-Timing и статистику процесса (stats),
+    медленные запросы с долей PROFILER_SLOW_SAMPLE_RATE пишутся в лог
+    вместе с повторяющимися SQL. Сбор - счётчики в execute_wrapper без
+    сохранения самих запросов, так что его можно держать включённым.
+    Работает и под WSGI, и под ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        if PROFILER_ENABLED:
+            instrument_serializers()
+            instrument_connections()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not PROFILER_ENABLED:
+            return self.get_response(request)
+        profile = RequestProfile()
+        with self.profiling(profile):
+            response = self.get_response(request)
+        return self.process_response(request, profile, response)
+
+    async def __acall__(self, request):
+        if not PROFILER_ENABLED:
+            return await self.get_response(request)
+        profile = RequestProfile()
+        with self.profiling(profile):
+            response = await self.get_response(request)
+        return self.process_response(request, profile, response)
+
+    def process_response(self, request, profile, response):
+        duration = time.perf_counter() - profile.started
+        timing = (
+            f'db;dur={profile.db_time * 1000:.1f};'
+            f'desc="{profile.queries} queries", '
+            f'ser;dur={profile.serializer_time * 1000:.1f}, '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        if response.has_header('Server-Timing'):
+            timing = f'{response["Server-Timing"]}, {timing}'
+        response['Server-Timing'] = timing
+        if not response.streaming:
+            self.finish(request, profile)
+        elif response.is_async:
+            response.streaming_content = self.aprofile_stream(
+                request, profile, response.streaming_content
+            )
+        else:
+            response.streaming_content = self.profile_stream(
+                request, profile, response.streaming_content
+            )
+        return response
+
+    @staticmethod
+    @contextmanager
+    def profiling(profile):
+        token = current_profile.set(profile)
+        try:
+            yield
+        finally:
+            current_profile.reset(token)
+
+    def profile_stream(self, request, profile, content):
+        """Потоковый ответ учитывается целиком, включая запросы при отдаче."""
+        with self.profiling(profile):
+            yield from content
+        self.finish(request, profile)
+
+    async def aprofile_stream(self, request, profile, content):
+        with self.profiling(profile):
+            async for chunk in content:
+                yield chunk
+        self.finish(request, profile)
+
+    def finish(self, request, profile):
+        duration = time.perf_counter() - profile.started
+        if profile.view_name is None:
+            profile.view_name = 'unresolved'
+        stats.add(profile, duration)
+        if (
+            duration * 1000 >= PROFILER_SLOW_REQUEST_MS
+            and random.random() < PROFILER_SLOW_SAMPLE_RATE
+        ):
+            self.log_slow_request(request, profile, duration)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.view_name = get_view_name(view_func, request.method)
+
+    @staticmethod
+    def log_slow_request(request, profile, duration):
+        duplicates = sorted(
+            profile.duplicates.items(), key=lambda item: item[1], reverse=True
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.0f мс, БД %.0f мс, '
+            'запросов %s, сериализация %.0f мс%s',
+            request.method,
+            request.path,
+            profile.view_name,
+            duration * 1000,
+            profile.db_time * 1000,
+            profile.queries,
+            profile.serializer_time * 1000,
+            ''.join(
+                f'\n  {count}x {sql[:300]}' for sql, count in duplicates[:5]
+            ),
+        )
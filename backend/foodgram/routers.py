@@ -0,0 +1,142 @@
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.views import APIView
+
+from foodgram.settings import (
+    DB_REPLICA_ALIAS,
+    DB_REPLICA_ENABLED,
+    DB_REPLICA_STICKY_SECONDS,
+)
+
+# Токен создаётся на default при входе, а клиент сразу шлёт с ним
+# GET, когда реплика могла ещё не получить строку.
+PRIMARY_READ_MODELS = {'authtoken.token'}
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+class RequestRouting:
+    """База для чтений в текущем HTTP-запросе, None - по умолчанию."""
+
+    def __init__(self):
+        self.database = None
+
+
+class ReplicaRouter:
+    """
+    Чтения идут в реплику, если ReplicaRoutingMiddleware разрешил её для
+    текущего запроса, запись - всегда в default.
+
+    Вне HTTP-запросов (команды, shell, миграции) всё идёт в default, как
+    и поиск токена при аутентификации (PRIMARY_READ_MODELS).
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in PRIMARY_READ_MODELS:
+            return DEFAULT_DB_ALIAS
+        routing = current_routing.get()
+        return routing.database if routing is not None else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия default, объекты из обеих баз совместимы.
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Отправляет чтения safe-методов DRF-view в реплику.
+
+    После успешного небезопасного запроса (избранное, корзина, подписка
+    и т.д.) чтения этого клиента DB_REPLICA_STICKY_SECONDS секунд идут в
+    default, чтобы отставание реплики не прятало его изменения. Клиент
+    определяется по заголовку Authorization: метку нужно проверить до
+    аутентификации DRF, а токен у пользователя один. Метки хранятся в
+    кэше, поэтому нужен общий для воркеров CACHE_BACKEND: с кэшем в
+    памяти процесса middleware не запускается.
+    Тело потокового ответа читается уже после middleware и идёт в default.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not DB_REPLICA_ENABLED:
+            raise MiddlewareNotUsed
+        if isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                'Для реплики нужен общий для воркеров CACHE_BACKEND '
+                '(Redis, Memcached, база данных): метки после записи '
+                'в кэше процесса не видны другим воркерам'
+            )
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.routing():
+            response = self.get_response(request)
+        key = self.get_sticky_key(request)
+        if self.makes_sticky(request, response, key):
+            cache.set(key, True, DB_REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        with self.routing():
+            response = await self.get_response(request)
+        key = self.get_sticky_key(request)
+        if self.makes_sticky(request, response, key):
+            await cache.aset(key, True, DB_REPLICA_STICKY_SECONDS)
+        return response
+
+    @staticmethod
+    @contextmanager
+    def routing():
+        token = current_routing.set(RequestRouting())
+        try:
+            yield
+        finally:
+            current_routing.reset(token)
+
+    @staticmethod
+    def get_sticky_key(request):
+        authorization = request.headers.get('Authorization')
+        if not authorization:
+            return None
+        digest = hashlib.md5(authorization.encode()).hexdigest()
+        return f'replica:sticky:{digest}'
+
+    @staticmethod
+    def makes_sticky(request, response, key):
+        return (
+            key is not None
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = current_routing.get()
+        view_class = getattr(view_func, 'cls', None)
+        if (
+            routing is None
+            or request.method not in SAFE_METHODS
+            or view_class is None
+            or not issubclass(view_class, APIView)
+        ):
+            return
+        key = self.get_sticky_key(request)
+        if key is None or not cache.get(key):
+            routing.database = DB_REPLICA_ALIAS
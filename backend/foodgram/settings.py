@@ -3,6 +3,8 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+from foodgram.databases import database_settings
+
 load_dotenv()
 
 
@@ -23,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
@@ -31,9 +34,12 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'djoser',
     'corsheaders',
+    'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'foodgram.profiling.QueryProfilerMiddleware',
+    'foodgram.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -65,17 +71,62 @@ TEMPLATES = [
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+# Под ASGI каждый запрос идёт в своём потоке, и постоянные соединения
+# копятся по потокам, поэтому там по умолчанию пул.
+DB_CONNECTION_PROFILE = os.getenv(
+    'DB_CONNECTION_PROFILE', 'pool' if SERVER_MODE == 'asgi' else 'persistent'
+)
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+DB_POOL_OPTIONS = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+}
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+
+DATABASE = {
+    'ENGINE': 'django.db.backends.postgresql',
+    'NAME': os.getenv('POSTGRES_DB'),
+    'USER': os.getenv('POSTGRES_USER'),
+    'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
+    'HOST': os.getenv('DB_HOST', ''),
+    'PORT': os.getenv('DB_PORT', '5432'),
+}
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': os.getenv('POSTGRES_DB'),
-        'USER': os.getenv('POSTGRES_USER'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
-        'HOST': os.getenv('DB_HOST', ''),
-        'PORT': '5432',
-    }
+    'default': database_settings(
+        DATABASE,
+        DB_CONNECTION_PROFILE,
+        DB_CONN_MAX_AGE,
+        DB_POOL_OPTIONS,
+        DB_PGBOUNCER,
+    )
 }
 
+# Реплика включается, если задан DB_REPLICA_NAME или DB_REPLICA_HOST.
+# Локально её заменяет вторая база на том же сервере.
+DB_REPLICA_ALIAS = 'replica'
+DB_REPLICA_NAME = os.getenv('DB_REPLICA_NAME')
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+DB_REPLICA_ENABLED = bool(DB_REPLICA_NAME or DB_REPLICA_HOST)
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+if DB_REPLICA_ENABLED:
+    DATABASES[DB_REPLICA_ALIAS] = database_settings(
+        {
+            **DATABASE,
+            'NAME': DB_REPLICA_NAME or DATABASE['NAME'],
+            'HOST': DB_REPLICA_HOST or DATABASE['HOST'],
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASE['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        },
+        DB_CONNECTION_PROFILE,
+        DB_CONN_MAX_AGE,
+        DB_POOL_OPTIONS,
+        DB_PGBOUNCER,
+    )
+    DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -84,6 +135,16 @@ DATABASES = {
 # }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -146,3 +207,32 @@ CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
 MIN_VALUE = 1
 MAX_VALUE = 32000
+MAX_SERVINGS = 100
+UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+    'ст. л.': ('ч. л.', 3),
+}
+INGREDIENTS_AUTOCOMPLETE_LIMIT = 50
+REFERENCE_CACHE_TIMEOUT = 300
+REFERENCE_CACHE_MAX_AGE = 60
+CURSOR_PAGE_SIZE = 6
+RECIPES_BATCH_LIMIT = 100
+PANTRY_INGREDIENTS_LIMIT = 100
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+RECIPE_IMAGE_VARIANTS = {
+    'card': ('480x320', {'crop': 'center', 'format': 'WEBP', 'quality': 80}),
+    'detail': ('1200x800', {'upscale': False, 'format': 'JPEG', 'quality': 85}),
+}
+APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('APPROXIMATE_COUNT_THRESHOLD', 100000)
+)
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'true').lower() == 'true'
+PROFILER_SLOW_REQUEST_MS = int(os.getenv('PROFILER_SLOW_REQUEST_MS', 500))
+PROFILER_SLOW_SAMPLE_RATE = float(os.getenv('PROFILER_SLOW_SAMPLE_RATE', 0.1))
+PROFILER_DUPLICATE_THRESHOLD = 3
+IMPORT_JOB_STALE_SECONDS = int(os.getenv('IMPORT_JOB_STALE_SECONDS', 300))
+IMPORT_JOB_MAX_ATTEMPTS = 3
+ASYNC_VIEWS = (
+    os.getenv('ASYNC_VIEWS', str(SERVER_MODE == 'asgi')).lower() == 'true'
+)
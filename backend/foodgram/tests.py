@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from foodgram.routers import (
+    ReplicaRouter,
+    ReplicaRoutingMiddleware,
+    RequestRouting,
+    current_routing,
+)
+from foodgram.settings import DB_REPLICA_ALIAS
+from recipes.models import Recipe
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        routing = RequestRouting()
+        routing.database = DB_REPLICA_ALIAS
+        token = current_routing.set(routing)
+        self.addCleanup(current_routing.reset, token)
+        self.router = ReplicaRouter()
+
+    def test_reads_follow_request_routing(self):
+        self.assertEqual(self.router.db_for_read(Recipe), DB_REPLICA_ALIAS)
+        self.assertEqual(self.router.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_token_is_read_from_default(self):
+        self.assertEqual(self.router.db_for_read(Token), DEFAULT_DB_ALIAS)
+
+
+@mock.patch('foodgram.routers.DB_REPLICA_ENABLED', True)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    def get_response(self, request):
+        return HttpResponse()
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }
+        }
+    )
+    def test_process_local_cache_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ReplicaRoutingMiddleware(self.get_response)
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                'LOCATION': 'cache',
+            }
+        }
+    )
+    def test_shared_cache_is_accepted(self):
+        ReplicaRoutingMiddleware(self.get_response)
@@ -0,0 +1,11 @@
+import os
+
+# SERVER_MODE=asgi запускает foodgram.asgi в воркерах uvicorn: запрос,
+# ждущий БД, не занимает процесс целиком. Число воркеров - WEB_CONCURRENCY.
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:6000')
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
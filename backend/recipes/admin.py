@@ -1,12 +1,11 @@
-import csv
-
 from django.contrib import admin, messages
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import path, reverse
 
 from recipes.models import (Favourite, Ingredient, IngredientImport,
-                            IngredientsInRecipe, Recipe, ShoppingList, Tag)
+                            IngredientsInRecipe, Recipe,
+                            ShoppingCartIngredient, ShoppingList, Tag)
 
 from .forms import IngredientImportForm
 
@@ -20,7 +19,7 @@ class IngredientsInRecipeInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientsInRecipeInline,)
-    list_display = ('name', 'author', 'pub_date')
+    list_display = ('name', 'author', 'pub_date', 'favorites_count')
 
 
 @admin.register(Favourite)
@@ -30,12 +29,53 @@ class FavouriteAdmin(admin.ModelAdmin):
 
 @admin.register(ShoppingList)
 class ShoppingListAdmin(admin.ModelAdmin):
-    list_display = ('recipe', 'user')
+    list_display = ('recipe', 'user', 'servings')
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
 
 
 @admin.register(IngredientImport)
 class IngredientImportAdmin(admin.ModelAdmin):
-    list_display = ('csv_file', 'date_add')
+    list_display = (
+        'csv_file',
+        'date_add',
+        'status',
+        'rows_processed',
+        'inserted',
+        'skipped',
+        'duplicates',
+        'invalid',
+        'duration',
+    )
+    list_filter = ('status',)
+    readonly_fields = (
+        'status',
+        'rows_processed',
+        'inserted',
+        'skipped',
+        'duplicates',
+        'invalid',
+        'error_log',
+        'started_at',
+        'heartbeat_at',
+        'attempts',
+        'finished_at',
+        'duration',
+    )
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['refresh_seconds'] = (
+            5
+            if IngredientImport.objects.filter(
+                status__in=(IngredientImport.PENDING, IngredientImport.RUNNING)
+            ).exists()
+            else None
+        )
+        return super().changelist_view(request, extra_context)
 
 
 @admin.register(Ingredient)
@@ -51,17 +91,16 @@ class IngredientAdmin(admin.ModelAdmin):
         if request.method == 'POST':
             form = IngredientImportForm(request.POST, request.FILES)
             if form.is_valid():
-                form_object = form.save()
-                with form_object.csv_file.open('r') as csv_file:
-                    rows = csv.reader(csv_file, delimiter=',')
-                    for row in rows:
-                        Ingredient.objects.update_or_create(
-                            name=row[0], measurement_unit=row[1]
-                        )
-                url = reverse('admin:index')
-                messages.success(request, 'Файл успешно импортирован')
+                form.save()
+                url = reverse('admin:recipes_ingredientimport_changelist')
+                messages.success(
+                    request,
+                    'Файл поставлен в очередь импорта, '
+                    'ход выполнения виден в истории импорта',
+                )
                 return HttpResponseRedirect(url)
-        form = IngredientImportForm()
+        else:
+            form = IngredientImportForm()
         return render(request, 'admin/csv_import_page.html', {'form': form})
 
 
@@ -0,0 +1,94 @@
+import threading
+import time
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+from recipes.versions import get_version
+
+INDEX_TTL = 300
+MIN_CONTAINS_LENGTH = 3
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный по casefold(name) массив ингредиентов в памяти процесса.
+
+    Поиск по префиксу идёт бинарным поиском без обращения к БД. Индекс
+    пересобирается, если сменилась версия Ingredient (её поднимают сигналы
+    и импорт) или прошло INDEX_TTL секунд, чтобы другие процессы тоже
+    увидели изменения.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.items = []
+        self.version = None
+        self.built_at = 0.0
+        self.lock = threading.Lock()
+
+    def build(self, version):
+        rows = sorted(
+            (name.casefold(), ingredient_id, name, measurement_unit)
+            for ingredient_id, name, measurement_unit in (
+                Ingredient.objects.order_by().values_list(
+                    'id', 'name', 'measurement_unit'
+                )
+            )
+        )
+        self.keys = [row[0] for row in rows]
+        self.items = [
+            {'id': row[1], 'name': row[2], 'measurement_unit': row[3]}
+            for row in rows
+        ]
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        version = get_version(Ingredient)
+        if (
+            version == self.version
+            and time.monotonic() - self.built_at < INDEX_TTL
+        ):
+            return
+        with self.lock:
+            if (
+                version != self.version
+                or time.monotonic() - self.built_at >= INDEX_TTL
+            ):
+                self.build(version)
+
+    def prefix(self, query, limit):
+        self.ensure_fresh()
+        query = query.casefold()
+        keys = self.keys
+        start = bisect_left(keys, query)
+        end = start
+        while (
+            end < len(keys)
+            and end - start < limit
+            and keys[end].startswith(query)
+        ):
+            end += 1
+        return self.items[start:end]
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def autocomplete(query, limit):
+    """
+    Сначала совпадения по префиксу из индекса в памяти, затем, если
+    места хватает, вхождения подстроки из БД (триграммный индекс).
+    """
+    query = query.strip()
+    if not query:
+        return []
+    results = ingredient_index.prefix(query, limit)
+    if len(results) >= limit or len(query) < MIN_CONTAINS_LENGTH:
+        return results
+    contains = (
+        Ingredient.objects.filter(name__icontains=query)
+        .exclude(name__istartswith=query)
+        .values('id', 'name', 'measurement_unit')[: limit - len(results)]
+    )
+    return results + list(contains)
@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favourite, Recipe, ShoppingList
+from users.models import CustomUser, Subscribe
+
+# Модель связи: (модель со счётчиком, поле связи, поле счётчика).
+COUNTERS = {
+    Favourite: (Recipe, 'recipe', 'favorites_count'),
+    ShoppingList: (Recipe, 'recipe', 'in_carts_count'),
+    Subscribe: (CustomUser, 'author', 'followers_count'),
+    Recipe: (CustomUser, 'author', 'recipes_count'),
+}
+
+
+def change_counter(model, ids, delta):
+    """Сдвигает счётчик, связанный с model, у объектов ids на delta."""
+    target, _, counter = COUNTERS[model]
+    ids = list(ids)
+    if not ids or not delta:
+        return
+    target.objects.filter(id__in=ids).update(
+        **{counter: Greatest(F(counter) + delta, Value(0))}
+    )
+
+
+def actual_count(model):
+    _, field, _ = COUNTERS[model]
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('id'))
+            .values('total')
+        ),
+        Value(0),
+    )
+
+
+def reconcile_counters(fix=True):
+    """
+    Сверяет счётчики с подсчётом по таблицам связей.
+
+    Возвращает {поле счётчика: число объектов с расхождением}; при fix
+    расходящиеся значения исправляются одним UPDATE на счётчик.
+    """
+    drift = {}
+    with transaction.atomic():
+        for model, (target, _, counter) in COUNTERS.items():
+            stale = target.objects.annotate(
+                actual=actual_count(model)
+            ).exclude(**{counter: F('actual')})
+            drift[counter] = stale.count()
+            if fix and drift[counter]:
+                target.objects.filter(id__in=stale.values('id')).update(
+                    **{counter: actual_count(model)}
+                )
+    return drift
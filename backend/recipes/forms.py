@@ -1,5 +1,7 @@
+from django.core.validators import FileExtensionValidator
 from django.forms import ModelForm
 
+from recipes.importers import IMPORT_FORMATS
 from recipes.models import IngredientImport
 
 
@@ -7,3 +9,9 @@ class IngredientImportForm(ModelForm):
     class Meta:
         model = IngredientImport
         fields = ('csv_file',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['csv_file'].validators.append(
+            FileExtensionValidator(allowed_extensions=IMPORT_FORMATS)
+        )
@@ -0,0 +1,30 @@
+import logging
+
+from sorl.thumbnail import get_thumbnail
+
+from foodgram.settings import RECIPE_IMAGE_VARIANTS
+
+logger = logging.getLogger(__name__)
+
+
+def get_image_variant(image, variant):
+    """
+    Уменьшенная и пережатая копия картинки рецепта.
+
+    Копии создаются sorl-thumbnail один раз и дальше берутся из его
+    key-value хранилища. Если копию сделать не удалось, отдаётся оригинал.
+    """
+    if not image:
+        return None
+    geometry, options = RECIPE_IMAGE_VARIANTS[variant]
+    try:
+        thumbnail = get_thumbnail(image, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать копию %s для %s', variant, image)
+        return image
+    return thumbnail or image
+
+
+def generate_image_variants(image):
+    for variant in RECIPE_IMAGE_VARIANTS:
+        get_image_variant(image, variant)
@@ -0,0 +1,316 @@
+import csv
+import io
+import json
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from foodgram.settings import IMPORT_JOB_MAX_ATTEMPTS, IMPORT_JOB_STALE_SECONDS
+from recipes.models import Ingredient, IngredientImport
+from recipes.versions import bump_version
+
+CHUNK_SIZE = 1000
+READ_SIZE = 64 * 1024
+MAX_ERRORS = 100
+IMPORT_FORMATS = ('csv', 'json')
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+MEASUREMENT_UNIT_MAX_LENGTH = Ingredient._meta.get_field(
+    'measurement_unit'
+).max_length
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    duration: float = 0.0
+    db_time: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def total(self):
+        return self.inserted + self.skipped + self.duplicates + self.invalid
+
+    def __str__(self):
+        return (
+            f'добавлено: {self.inserted}, уже были: {self.skipped}, '
+            f'повторы в файле: {self.duplicates}, '
+            f'ошибочных строк: {self.invalid}, '
+            f'время: {self.duration:.2f} с (БД {self.db_time:.2f} с)'
+        )
+
+
+def get_file_format(file_name):
+    file_format = os.path.splitext(file_name)[1].lstrip('.').lower()
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(
+            f'Неподдерживаемый формат файла: {file_name}, '
+            f'допустимы {", ".join(IMPORT_FORMATS)}'
+        )
+    return file_format
+
+
+def read_json_array(file, read_size=READ_SIZE):
+    """
+    Элементы JSON-массива верхнего уровня по одному.
+
+    Файл читается кусками по read_size символов, и в памяти держится
+    только ещё не разобранный хвост, а не весь документ, как у json.load.
+    Пока за элементом в буфере не видно запятой или ], он разбирается
+    заново после дочитывания: число могло оборваться на границе куска.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        data = file.read(read_size)
+        eof = not data
+        buffer = buffer[position:] + data
+        position = 0
+
+    def peek():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            fill()
+
+    if peek() != '[':
+        raise ValueError('Ожидался JSON-массив записей')
+    position += 1
+    if peek() == ']':
+        return
+    while True:
+        try:
+            row, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        after = end
+        while after < len(buffer) and buffer[after].isspace():
+            after += 1
+        if not eof and buffer[after:after + 1] not in (',', ']'):
+            fill()
+            continue
+        position = end
+        yield row
+        separator = peek()
+        position += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(
+                f'Ожидалась запятая или ]: {separator or "конец файла"}'
+            )
+        if peek() == ']':
+            raise ValueError('Лишняя запятая перед ]')
+
+
+def read_rows(file, file_format):
+    """Отдаёт записи файла как есть: списки для CSV, объекты для JSON."""
+    if file_format == 'csv':
+        yield from csv.reader(file, delimiter=',')
+    else:
+        yield from read_json_array(file)
+
+
+def clean_row(row):
+    """
+    Пара (name, measurement_unit) из записи файла или None, в том числе
+    для значений длиннее max_length полей Ingredient: иначе bulk_create
+    упал бы на всей пачке.
+    """
+    if isinstance(row, dict):
+        row = (row.get('name'), row.get('measurement_unit'))
+    if not isinstance(row, (list, tuple)) or len(row) < 2:
+        return None
+    name, measurement_unit = (str(value or '').strip() for value in row[:2])
+    if not name or not measurement_unit:
+        return None
+    if (
+        len(name) > NAME_MAX_LENGTH
+        or len(measurement_unit) > MEASUREMENT_UNIT_MAX_LENGTH
+    ):
+        return None
+    return name, measurement_unit
+
+
+def import_ingredients(
+    file, file_format, chunk_size=CHUNK_SIZE, on_progress=None
+):
+    """
+    Импорт ингредиентов пачками через bulk_create.
+
+    Повторы внутри файла отбрасываются в памяти, уже существующие пары
+    (name, measurement_unit) пропускаются, новые вставляются одним
+    запросом на пачку. on_progress(result) вызывается после каждой пачки.
+    """
+    result = ImportResult()
+    started = time.monotonic()
+    seen = set()
+    rows = enumerate(read_rows(file, file_format), start=1)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        pairs = []
+        for row_number, row in chunk:
+            pair = clean_row(row)
+            if pair is None:
+                result.invalid += 1
+                if len(result.errors) < MAX_ERRORS:
+                    result.errors.append(
+                        f'Запись {row_number}: некорректные данные {row!r}'
+                    )
+            elif pair in seen:
+                result.duplicates += 1
+            else:
+                seen.add(pair)
+                pairs.append(pair)
+        if pairs:
+            db_started = time.monotonic()
+            existing = set(
+                Ingredient.objects.filter(
+                    name__in={name for name, _ in pairs}
+                ).values_list('name', 'measurement_unit')
+            )
+            new = [pair for pair in pairs if pair not in existing]
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in new
+                ],
+                ignore_conflicts=True,
+            )
+            result.db_time += time.monotonic() - db_started
+            result.inserted += len(new)
+            result.skipped += len(pairs) - len(new)
+        result.duration = time.monotonic() - started
+        if on_progress is not None:
+            on_progress(result)
+    result.duration = time.monotonic() - started
+    if result.inserted:
+        bump_version(Ingredient)
+    return result
+
+
+def requeue_stale_jobs(stale_seconds=IMPORT_JOB_STALE_SECONDS):
+    """
+    Возвращает в очередь задачи RUNNING, воркер которых упал.
+
+    Живой воркер обновляет heartbeat_at после каждой пачки; задача без
+    отклика дольше stale_seconds считается брошенной. Импорт идемпотентен,
+    поэтому задача начинается заново, но после IMPORT_JOB_MAX_ATTEMPTS
+    попыток помечается FAILED, чтобы файл, роняющий воркер, не крутился
+    в очереди вечно. Возвращает (возвращено в очередь, помечено FAILED).
+    """
+    now = timezone.now()
+    stale = IngredientImport.objects.filter(
+        status=IngredientImport.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=stale_seconds),
+    )
+    failed = stale.filter(attempts__gte=IMPORT_JOB_MAX_ATTEMPTS).update(
+        status=IngredientImport.FAILED,
+        finished_at=now,
+        error_log=(
+            f'Воркер не отвечал {stale_seconds} с, '
+            f'попыток: {IMPORT_JOB_MAX_ATTEMPTS}'
+        ),
+    )
+    requeued = stale.update(status=IngredientImport.PENDING)
+    return requeued, failed
+
+
+def claim_import_job():
+    """Забирает самую старую задачу из очереди, не блокируя другие воркеры."""
+    requeue_stale_jobs()
+    with transaction.atomic():
+        job = (
+            IngredientImport.objects.select_for_update(skip_locked=True)
+            .filter(status=IngredientImport.PENDING)
+            .order_by('date_add', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = IngredientImport.RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save(
+            update_fields=('status', 'started_at', 'heartbeat_at', 'attempts')
+        )
+    return job
+
+
+def save_job_progress(job, result, **fields):
+    job.rows_processed = result.total
+    job.inserted = result.inserted
+    job.skipped = result.skipped
+    job.duplicates = result.duplicates
+    job.invalid = result.invalid
+    job.duration = timedelta(seconds=result.duration)
+    job.error_log = '\n'.join(result.errors)
+    job.heartbeat_at = timezone.now()
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(
+        update_fields=(
+            'rows_processed',
+            'inserted',
+            'skipped',
+            'duplicates',
+            'invalid',
+            'duration',
+            'error_log',
+            'heartbeat_at',
+            *fields,
+        )
+    )
+
+
+def run_import_job(job, chunk_size=CHUNK_SIZE):
+    result = ImportResult()
+    started = time.monotonic()
+
+    def on_progress(progress):
+        nonlocal result
+        result = progress
+        save_job_progress(job, result)
+
+    try:
+        with job.csv_file.open('rb') as import_file:
+            result = import_ingredients(
+                io.TextIOWrapper(import_file, encoding='utf-8'),
+                get_file_format(job.csv_file.name),
+                chunk_size,
+                on_progress,
+            )
+    except Exception:
+        result.duration = time.monotonic() - started
+        result.errors.append(traceback.format_exc())
+        save_job_progress(
+            job,
+            result,
+            status=IngredientImport.FAILED,
+            finished_at=timezone.now(),
+        )
+        return job
+    save_job_progress(
+        job, result, status=IngredientImport.DONE, finished_at=timezone.now()
+    )
+    return job
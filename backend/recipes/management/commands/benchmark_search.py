@@ -0,0 +1,134 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from recipes.models import IngredientsInRecipe, Recipe
+from recipes.search import search_recipes, update_search_vectors
+from recipes.synthetic import WORDS, create_ingredients
+
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими рецептами и сравнивает полнотекстовый '
+        'поиск с icontains; данные откатываются, если не указан --keep'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=100000,
+            help='Сколько рецептов создать',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз повторить каждый запрос',
+        )
+        parser.add_argument(
+            '--terms',
+            type=int,
+            default=10,
+            help='Сколько поисковых слов проверить',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Не откатывать созданные рецепты',
+        )
+
+    def seed(self, count, rnd):
+        ingredient_ids = create_ingredients(len(WORDS) * 10)
+        recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    name=' '.join(rnd.sample(WORDS, 3)),
+                    description=' '.join(rnd.choices(WORDS, k=20)),
+                    time_to_cook=rnd.randint(5, 180),
+                )
+                for _ in range(count)
+            ],
+            batch_size=5000,
+        )
+        IngredientsInRecipe.objects.bulk_create(
+            [
+                IngredientsInRecipe(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=1
+                )
+                for recipe in recipes
+                for ingredient_id in rnd.sample(ingredient_ids, 5)
+            ],
+            batch_size=5000,
+        )
+        update_search_vectors(
+            Recipe.objects.filter(
+                id__gte=recipes[0].id, id__lte=recipes[-1].id
+            )
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE recipes_recipe')
+            cursor.execute('ANALYZE recipes_ingredientsinrecipe')
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset[:PAGE_SIZE])
+            total = queryset.count()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000, total
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Полнотекстовый поиск работает с PostgreSQL')
+        rnd = random.Random(options['seed'])
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.seed(options['recipes'], rnd)
+            self.stdout.write(
+                f'Создано рецептов: {options["recipes"]} '
+                f'за {time.perf_counter() - started:.1f} с'
+            )
+            results = []
+            for term in rnd.sample(WORDS, options['terms']):
+                naive = (
+                    Recipe.objects.filter(
+                        Q(name__icontains=term)
+                        | Q(description__icontains=term)
+                        | Q(ingredients__name__icontains=term)
+                    )
+                    .distinct()
+                    .order_by('-pub_date', '-id')
+                )
+                naive_ms, naive_total = self.measure(
+                    naive, options['repeat']
+                )
+                ranked_ms, ranked_total = self.measure(
+                    search_recipes(Recipe.objects.all(), term),
+                    options['repeat'],
+                )
+                results.append((naive_ms, ranked_ms))
+                self.stdout.write(
+                    f'{term}: icontains {naive_ms:.1f} мс '
+                    f'({naive_total}), поиск {ranked_ms:.1f} мс '
+                    f'({ranked_total})'
+                )
+            naive_ms = statistics.median(row[0] for row in results)
+            ranked_ms = statistics.median(row[1] for row in results)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Медиана: icontains {naive_ms:.1f} мс, '
+                    f'поиск {ranked_ms:.1f} мс, '
+                    f'ускорение {naive_ms / ranked_ms:.1f}x'
+                )
+            )
+            if not options['keep']:
+                transaction.set_rollback(True)
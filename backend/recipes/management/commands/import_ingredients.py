@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.importers import CHUNK_SIZE, get_file_format, import_ingredients
+
+
+class Command(BaseCommand):
+    help = 'Импорт ингредиентов из CSV или JSON файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к .csv или .json файлу')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Сколько строк вставлять за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            file_format = get_file_format(options['path'])
+            with open(options['path'], encoding='utf-8') as import_file:
+                result = import_ingredients(
+                    import_file, file_format, options['chunk_size']
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f'Импорт завершён: {result}'))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.importers import CHUNK_SIZE, claim_import_job, run_import_job
+from recipes.models import IngredientImport
+
+
+class Command(BaseCommand):
+    help = 'Воркер очереди импорта ингредиентов из IngredientImport'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь и завершиться',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза между опросами пустой очереди, в секундах',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Сколько строк вставлять за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_import_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+            self.stdout.write(f'Импорт {job}: начат')
+            run_import_job(job, options['chunk_size'])
+            style = (
+                self.style.SUCCESS
+                if job.status == IngredientImport.DONE
+                else self.style.ERROR
+            )
+            self.stdout.write(
+                style(
+                    f'Импорт {job}: {job.get_status_display()}, '
+                    f'строк {job.rows_processed}, '
+                    f'добавлено {job.inserted}, за {job.duration}'
+                )
+            )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики избранного, списков покупок, рецептов и '
+        'подписчиков с таблицами связей и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(fix=not options['check'])
+        for counter, stale in drift.items():
+            self.stdout.write(f'{counter}: расхождений {stale}')
+        if options['check']:
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Исправлено объектов: {sum(drift.values())}'
+            )
+        )
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.models import (
+    IngredientsInRecipe,
+    ShoppingCartIngredient,
+    ShoppingList,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет агрегат списков покупок с подсчётом по ShoppingList '
+        'и при --rebuild пересобирает его'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересобрать агрегат с нуля',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Ограничить проверку пользователем с этим id',
+        )
+
+    @staticmethod
+    def lock_sources():
+        """
+        SHARE-блокировка таблиц, из которых считается агрегат: корзины и
+        составы рецептов не меняются, пока агрегат пересобирается, а
+        уже начатые изменения сначала закоммитятся.
+        """
+        tables = ', '.join(
+            connection.ops.quote_name(model._meta.db_table)
+            for model in (ShoppingList, IngredientsInRecipe)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {tables} IN SHARE MODE')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['rebuild']:
+                self.lock_sources()
+            self.check_aggregate(options)
+
+    def check_aggregate(self, options):
+        users = options['users']
+        stored_queryset = ShoppingCartIngredient.objects.all()
+        if users:
+            stored_queryset = stored_queryset.filter(user_id__in=users)
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in stored_queryset.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        expected = {
+            (row['user'], row['ingredient']): row['total']
+            for row in ShoppingCartIngredient.objects.calculate(users)
+        }
+        drift = {
+            key: (stored.get(key), expected.get(key))
+            for key in stored.keys() | expected.keys()
+            if stored.get(key) != expected.get(key)
+        }
+        for (user_id, ingredient_id), (actual, total) in sorted(
+            drift.items()
+        ):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'в агрегате {actual}, должно быть {total}'
+            )
+        self.stdout.write(
+            f'Проверено строк: {len(expected)}, расхождений: {len(drift)}'
+        )
+        if not options['rebuild']:
+            return
+        stored_queryset.delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            [
+                ShoppingCartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                )
+                for (user_id, ingredient_id), amount in expected.items()
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Агрегат пересобран: {len(expected)} строк')
+        )
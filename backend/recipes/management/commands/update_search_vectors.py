@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы рецептов пачками по id'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Сколько рецептов обновлять одним запросом',
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Только рецепты без вектора (после миграции, при деплое)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        recipes = Recipe.objects.all()
+        if options['missing']:
+            recipes = recipes.filter(search_vector__isnull=True)
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                recipes.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            updated += update_search_vectors(
+                recipes.filter(id__gte=ids[0], id__lte=ids[-1])
+            )
+            last_id = ids[-1]
+            self.stdout.write(f'Обновлено: {updated}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Поисковые векторы пересчитаны: {updated}')
+        )
@@ -1,11 +1,15 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (
     MaxValueValidator,
     MinValueValidator,
     RegexValidator,
 )
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Upper
 
-from foodgram.settings import MAX_VALUE, MIN_VALUE
+from foodgram.settings import MAX_SERVINGS, MAX_VALUE, MIN_VALUE
 from users.models import CustomUser
 
 LENGTH_MAX = 200
@@ -21,14 +25,61 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_prefix_idx',
+            ),
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='ingredient_name_trgm_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='Ингредиенты не должны повторяться',
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
 class IngredientImport(models.Model):
-    csv_file = models.FileField(upload_to='ingredients/')
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершён'),
+        (FAILED, 'Ошибка'),
+    )
+
+    csv_file = models.FileField('Файл', upload_to='ingredients/')
     date_add = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True,
+    )
+    rows_processed = models.PositiveIntegerField('Обработано строк', default=0)
+    inserted = models.PositiveIntegerField('Добавлено', default=0)
+    skipped = models.PositiveIntegerField('Уже были', default=0)
+    duplicates = models.PositiveIntegerField('Повторы в файле', default=0)
+    invalid = models.PositiveIntegerField('Ошибочных строк', default=0)
+    error_log = models.TextField('Журнал ошибок', blank=True)
+    started_at = models.DateTimeField('Начат', null=True, blank=True)
+    heartbeat_at = models.DateTimeField(
+        'Последний отклик воркера', null=True, blank=True
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    finished_at = models.DateTimeField('Завершён', null=True, blank=True)
+    duration = models.DurationField('Длительность', null=True, blank=True)
 
     class Meta:
         ordering = ['date_add']
@@ -92,11 +143,45 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации рецепта', auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    version = models.PositiveIntegerField(
+        'Версия карточки', default=0, editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popular_idx',
+            ),
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Версия из ключа фрагмента карточки (api.feed) растёт в том же
+        # UPDATE: сохранение устаревшей копии не вернёт её назад.
+        if not self._state.adding:
+            self.version = models.F('version') + 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -120,6 +205,7 @@ class IngredientsInRecipe(models.Model):
         constraints = [
             models.UniqueConstraint(
                 fields=['recipe', 'ingredient'],
+                include=['amount'],
                 name='Рецепты не должны повторяться',
             )
         ]
@@ -142,6 +228,14 @@ class ShoppingList(models.Model):
         on_delete=models.CASCADE,
         related_name='shopping_recipe',
     )
+    servings = models.PositiveSmallIntegerField(
+        'Порций',
+        default=1,
+        validators=[
+            MinValueValidator(MIN_VALUE),
+            MaxValueValidator(MAX_SERVINGS),
+        ],
+    )
 
     class Meta:
         ordering = ['recipe']
@@ -181,3 +275,184 @@ class Favourite(models.Model):
 
     def __str__(self):
         return f'{self.user} добавил рецепт {self.recipe} в избранное'
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """Инкрементальное обновление агрегата списка покупок."""
+
+    @staticmethod
+    def recipe_amounts(recipe):
+        return dict(
+            recipe.ingredientsinrecipe_set.values_list(
+                'ingredient_id', 'amount'
+            )
+        )
+
+    def apply(self, user_ids, amounts):
+        """Прибавляет amounts {ingredient_id: delta} к корзинам user_ids."""
+        user_ids = list(user_ids)
+        amounts = {
+            ingredient_id: delta
+            for ingredient_id, delta in amounts.items()
+            if delta
+        }
+        if not user_ids or not amounts:
+            return
+        by_delta = {}
+        for ingredient_id, delta in amounts.items():
+            by_delta.setdefault(delta, []).append(ingredient_id)
+        with transaction.atomic():
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id, ingredient_id=ingredient_id, amount=0
+                    )
+                    for user_id in user_ids
+                    for ingredient_id in amounts
+                ],
+                ignore_conflicts=True,
+            )
+            for delta, ingredient_ids in by_delta.items():
+                self.filter(
+                    user_id__in=user_ids, ingredient_id__in=ingredient_ids
+                ).update(amount=F('amount') + delta)
+            self.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=amounts,
+                amount__lte=0,
+            ).delete()
+
+    @staticmethod
+    def recipes_amounts(recipe_ids):
+        """Суммарные количества ингредиентов нескольких рецептов."""
+        return dict(
+            IngredientsInRecipe.objects.filter(recipe_id__in=recipe_ids)
+            .values('ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+            .values_list('ingredient', 'total')
+        )
+
+    def scaled_amounts(self, servings, sign=1):
+        """Количества для {recipe_id: порций}, умноженные на sign."""
+        recipes_by_servings = {}
+        for recipe_id, count in servings.items():
+            recipes_by_servings.setdefault(count, []).append(recipe_id)
+        amounts = {}
+        for count, recipe_ids in recipes_by_servings.items():
+            for ingredient_id, amount in self.recipes_amounts(
+                recipe_ids
+            ).items():
+                amounts[ingredient_id] = (
+                    amounts.get(ingredient_id, 0) + sign * count * amount
+                )
+        return amounts
+
+    def add_recipes(self, user_id, recipe_ids, servings=1):
+        self.apply(
+            [user_id],
+            self.scaled_amounts(
+                {recipe_id: servings for recipe_id in recipe_ids}
+            ),
+        )
+
+    def remove_recipes(self, user_id, servings):
+        """Убирает рецепты {recipe_id: порций} из корзины user_id."""
+        self.apply([user_id], self.scaled_amounts(servings, sign=-1))
+
+    def change_servings(self, user, recipe, old_servings, new_servings):
+        self.apply(
+            [user.id],
+            {
+                ingredient_id: (new_servings - old_servings) * amount
+                for ingredient_id, amount in self.recipe_amounts(
+                    recipe
+                ).items()
+            },
+        )
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта во все корзины с ним."""
+        deltas = {
+            ingredient_id: new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        users_by_servings = {}
+        for user_id, servings in ShoppingList.objects.filter(
+            recipe=recipe
+        ).values_list('user_id', 'servings'):
+            users_by_servings.setdefault(servings, []).append(user_id)
+        for servings, user_ids in users_by_servings.items():
+            self.apply(
+                user_ids,
+                {
+                    ingredient_id: servings * delta
+                    for ingredient_id, delta in deltas.items()
+                },
+            )
+
+    def delete_recipe(self, recipe):
+        self.change_recipe(recipe, self.recipe_amounts(recipe), {})
+
+    @staticmethod
+    def calculate(users=None):
+        """Агрегат, посчитанный заново по ShoppingList."""
+        if users is None:
+            queryset = IngredientsInRecipe.objects.filter(
+                recipe__shopping_recipe__isnull=False
+            )
+        else:
+            queryset = IngredientsInRecipe.objects.filter(
+                recipe__shopping_recipe__user__in=users
+            )
+        return (
+            queryset.values(
+                'ingredient', user=F('recipe__shopping_recipe__user')
+            )
+            .annotate(
+                total=Sum(F('amount') * F('recipe__shopping_recipe__servings'))
+            )
+            .order_by()
+        )
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+    )
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    amount = models.IntegerField('Количество')
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        ordering = ['user', 'ingredient']
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                include=['amount'],
+                name='Ингредиент в списке покупок один',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}: {self.amount}'
+
+
+class DataVersion(models.Model):
+    """Версия данных модели для кэшей процессов: ETag, индексы в памяти."""
+
+    label = models.CharField('Модель', max_length=LENGTH_MAX, primary_key=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.label}: {self.version}'
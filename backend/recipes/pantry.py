@@ -0,0 +1,97 @@
+import threading
+import time
+from array import array
+from collections import Counter, namedtuple
+
+from recipes.models import IngredientsInRecipe
+from recipes.versions import get_version
+
+INDEX_TTL = 300
+MIN_REBUILD_INTERVAL = 10
+BUILD_CHUNK_SIZE = 10000
+
+PantryMatch = namedtuple('PantryMatch', ('recipe_id', 'matched', 'required'))
+PantrySnapshot = namedtuple(
+    'PantrySnapshot', ('postings', 'required', 'version', 'built_at')
+)
+
+
+class PantryIndex:
+    """
+    Инвертированный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится массив id рецептов, для каждого
+    рецепта - число его ингредиентов. Индекс пересобирается, если сменилась
+    версия IngredientsInRecipe (не чаще раза в MIN_REBUILD_INTERVAL секунд)
+    или прошло INDEX_TTL секунд. Пересборка подменяет снимок одним
+    присваиванием, а запрос читает снимок один раз, поэтому массивы
+    рецептов и числа ингредиентов всегда из одной сборки.
+    """
+
+    def __init__(self):
+        self.snapshot = PantrySnapshot({}, {}, None, 0.0)
+        self.lock = threading.Lock()
+
+    def build(self, version):
+        postings = {}
+        required = Counter()
+        rows = (
+            IngredientsInRecipe.objects.order_by()
+            .values_list('ingredient_id', 'recipe_id')
+            .iterator(chunk_size=BUILD_CHUNK_SIZE)
+        )
+        for ingredient_id, recipe_id in rows:
+            recipe_ids = postings.get(ingredient_id)
+            if recipe_ids is None:
+                recipe_ids = postings[ingredient_id] = array('q')
+            recipe_ids.append(recipe_id)
+            required[recipe_id] += 1
+        self.snapshot = PantrySnapshot(
+            postings, dict(required), version, time.monotonic()
+        )
+        return self.snapshot
+
+    @staticmethod
+    def is_fresh(snapshot, version):
+        age = time.monotonic() - snapshot.built_at
+        return age < INDEX_TTL and (
+            version == snapshot.version or age < MIN_REBUILD_INTERVAL
+        )
+
+    def ensure_fresh(self):
+        """Актуальный снимок индекса, при необходимости пересобранный."""
+        version = get_version(IngredientsInRecipe)
+        snapshot = self.snapshot
+        if self.is_fresh(snapshot, version):
+            return snapshot
+        with self.lock:
+            snapshot = self.snapshot
+            if self.is_fresh(snapshot, version):
+                return snapshot
+            return self.build(version)
+
+    def match(self, ingredient_ids, max_missing):
+        """
+        Рецепты, где есть хотя бы один из ingredient_ids и не хватает
+        не больше max_missing ингредиентов, по убыванию доли имеющихся.
+        """
+        snapshot = self.ensure_fresh()
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(snapshot.postings.get(ingredient_id, ()))
+        matches = []
+        for recipe_id, count in matched.items():
+            required = snapshot.required.get(recipe_id)
+            if required is not None and required - count <= max_missing:
+                matches.append(PantryMatch(recipe_id, count, required))
+        matches.sort(
+            key=lambda match: (
+                -match.matched / match.required,
+                -match.matched,
+                -match.recipe_id,
+            )
+        )
+        return matches
+
+
+pantry_index = PantryIndex()
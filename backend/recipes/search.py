@@ -0,0 +1,48 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connections, router
+from django.db.models import F, OuterRef, Subquery
+
+from foodgram.settings import SEARCH_CONFIG
+from recipes.models import IngredientsInRecipe, Recipe
+
+
+def search_vector():
+    """Название весит больше описания, описание больше ингредиентов."""
+    ingredient_names = Subquery(
+        IngredientsInRecipe.objects.filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names, weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes):
+    """Пересчитывает search_vector одним UPDATE для queryset рецептов."""
+    if connections[router.db_for_write(Recipe)].vendor != 'postgresql':
+        return 0
+    return recipes.update(search_vector=search_vector())
+
+
+def update_recipe_search(recipe_ids):
+    return update_search_vectors(Recipe.objects.filter(id__in=recipe_ids))
+
+
+def search_recipes(queryset, text):
+    """Рецепты, подходящие под запрос text, в порядке релевантности."""
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', '-pub_date', '-id')
+    )
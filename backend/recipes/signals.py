@@ -0,0 +1,170 @@
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from recipes.counters import COUNTERS, change_counter
+from recipes.images import generate_image_variants
+from recipes.models import (
+    Favourite,
+    Ingredient,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingCartIngredient,
+    ShoppingList,
+    Tag,
+)
+from recipes.search import update_recipe_search, update_search_vectors
+from recipes.versions import bump_version
+from users.models import CustomUser, Subscribe
+
+# Поля строк, от которых зависит агрегат списка покупок.
+CART_FIELDS = {
+    ShoppingList: ('user_id', 'recipe_id', 'servings'),
+    IngredientsInRecipe: ('recipe_id', 'ingredient_id', 'amount'),
+}
+
+
+def deleted_with(origin, *models):
+    """Удаление идёт каскадом от объекта или QuerySet одной из models."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_variants(instance, **kwargs):
+    if instance.image:
+        generate_image_variants(instance.image)
+
+
+@receiver((post_save, post_delete), sender=Favourite)
+@receiver((post_save, post_delete), sender=ShoppingList)
+@receiver((post_save, post_delete), sender=Subscribe)
+@receiver((post_save, post_delete), sender=Recipe)
+def update_counter(sender, instance, signal, created=False, **kwargs):
+    """Счётчики для изменений через ORM; API пишет связи сам."""
+    if signal is post_save and not created:
+        return
+    field = sender._meta.get_field(COUNTERS[sender][1]).attname
+    change_counter(
+        sender, [getattr(instance, field)], 1 if created else -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(instance, **kwargs):
+    update_recipe_search([instance.id])
+
+
+@receiver((post_save, post_delete), sender=IngredientsInRecipe)
+def update_recipe_ingredients(instance, **kwargs):
+    update_recipe_search([instance.recipe_id])
+    bump_version(IngredientsInRecipe)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search_vector(instance, created, **kwargs):
+    if not created:
+        update_search_vectors(
+            Recipe.objects.filter(
+                id__in=IngredientsInRecipe.objects.filter(
+                    ingredient=instance
+                ).values('recipe_id')
+            )
+        )
+
+
+@receiver(pre_save, sender=ShoppingList)
+@receiver(pre_save, sender=IngredientsInRecipe)
+def remember_cart_row(sender, instance, **kwargs):
+    """Прежние значения строки, чтобы post_save сдвинул агрегат на разницу."""
+    instance.cart_row = (
+        None
+        if instance._state.adding
+        else sender.objects.filter(pk=instance.pk)
+        .values(*CART_FIELDS[sender])
+        .first()
+    )
+
+
+@receiver(post_save, sender=ShoppingList)
+def update_cart_aggregate(instance, **kwargs):
+    """
+    Агрегат для изменений через ORM (админка, shell); API пишет связи
+    без сигналов и обновляет агрегат сам.
+    """
+    old = instance.cart_row
+    if old is not None:
+        ShoppingCartIngredient.objects.remove_recipes(
+            old['user_id'], {old['recipe_id']: old['servings']}
+        )
+    ShoppingCartIngredient.objects.add_recipes(
+        instance.user_id, [instance.recipe_id], instance.servings
+    )
+
+
+@receiver(post_delete, sender=ShoppingList)
+def remove_cart_aggregate(instance, origin, **kwargs):
+    # Рецепт убирает себя из корзин в pre_delete, а строки агрегата
+    # удалённого пользователя удаляются каскадом.
+    if deleted_with(origin, Recipe, CustomUser):
+        return
+    ShoppingCartIngredient.objects.remove_recipes(
+        instance.user_id, {instance.recipe_id: instance.servings}
+    )
+
+
+@receiver(post_save, sender=IngredientsInRecipe)
+def update_recipe_cart_aggregate(instance, **kwargs):
+    old = instance.cart_row
+    new_amounts = {instance.ingredient_id: instance.amount}
+    if old is not None and old['recipe_id'] == instance.recipe_id:
+        ShoppingCartIngredient.objects.change_recipe(
+            instance.recipe_id,
+            {old['ingredient_id']: old['amount']},
+            new_amounts,
+        )
+        return
+    if old is not None:
+        ShoppingCartIngredient.objects.change_recipe(
+            old['recipe_id'], {old['ingredient_id']: old['amount']}, {}
+        )
+    ShoppingCartIngredient.objects.change_recipe(
+        instance.recipe_id, {}, new_amounts
+    )
+
+
+@receiver(post_delete, sender=IngredientsInRecipe)
+def remove_recipe_cart_aggregate(instance, origin, **kwargs):
+    # Строки агрегата удалённого ингредиента удаляются каскадом.
+    if deleted_with(origin, Recipe, Ingredient):
+        return
+    ShoppingCartIngredient.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: instance.amount}, {}
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_carts(instance, **kwargs):
+    """До каскада, пока строки ShoppingList и состава рецепта на месте."""
+    ShoppingCartIngredient.objects.delete_recipe(instance)
+
+
+def create_trigram_extension(using, **kwargs):
+    """pg_trgm нужен для триграммного индекса по названию ингредиента."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
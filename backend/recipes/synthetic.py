@@ -0,0 +1,261 @@
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from recipes.counters import reconcile_counters
+from recipes.models import (
+    Favourite,
+    Ingredient,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingCartIngredient,
+    ShoppingList,
+    Tag,
+)
+from recipes.search import update_search_vectors
+from recipes.versions import bump_version
+from users.models import CustomUser, Subscribe
+
+WORDS = (
+    'борщ', 'суп', 'салат', 'пирог', 'каша', 'котлеты', 'плов', 'блины',
+    'запеканка', 'рагу', 'омлет', 'паста', 'шарлотка', 'окрошка', 'жаркое',
+    'гуляш', 'сырники', 'вареники', 'пельмени', 'солянка', 'щи', 'уха',
+    'оладьи', 'тефтели', 'голубцы', 'драники', 'манты', 'лазанья', 'ризотто',
+    'курица', 'говядина', 'свинина', 'рыба', 'грибы', 'картофель',
+    'капуста', 'морковь', 'свёкла', 'тыква', 'яблоки', 'творог', 'сыр',
+    'домашний', 'быстрый', 'праздничный', 'постный', 'острый', 'сладкий',
+    'летний', 'зимний', 'деревенский', 'бабушкин', 'лёгкий', 'сытный',
+)
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.')
+USERNAME_PREFIX = 'synthetic_'
+DESCRIPTION_MAX_LENGTH = Recipe._meta.get_field('description').max_length
+TAG_PREFIX = 'synthetic-'
+PASSWORD = 'synthetic-password'
+BATCH_SIZE = 2000
+
+
+def skewed_choice(rnd, population):
+    """
+    Элемент population, чаще из начала списка.
+
+    Так рецепты, избранное, корзины и подписки сосредоточены на небольшой
+    доле популярных авторов и рецептов, как в живой базе.
+    """
+    return population[int(len(population) * rnd.random() ** 3)]
+
+
+def skewed_sample(rnd, population, count):
+    """Не больше половины population разных элементов skewed_choice."""
+    count = min(count, len(population) // 2)
+    chosen = set()
+    while len(chosen) < count:
+        chosen.add(skewed_choice(rnd, population))
+    return list(chosen)
+
+
+def batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def create_ingredients(count):
+    Ingredient.objects.bulk_create(
+        [
+            Ingredient(
+                name=f'{WORDS[number % len(WORDS)]} {number // len(WORDS)}',
+                measurement_unit=UNITS[number % len(UNITS)],
+            )
+            for number in range(count)
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return list(Ingredient.objects.values_list('id', flat=True))
+
+
+def create_tags(count):
+    Tag.objects.bulk_create(
+        [
+            Tag(
+                name=f'{WORDS[number % len(WORDS)]} {number}'[:16],
+                color=f'#{number * 2654435761 % 0x1000000:06x}',
+                slug=f'{TAG_PREFIX}{number}',
+            )
+            for number in range(count)
+        ],
+        ignore_conflicts=True,
+    )
+    return list(
+        Tag.objects.filter(slug__startswith=TAG_PREFIX).values_list(
+            'id', flat=True
+        )
+    )
+
+
+def create_users(count):
+    """Пользователи с общим паролем PASSWORD; номера продолжают прошлые."""
+    offset = CustomUser.objects.filter(
+        username__startswith=USERNAME_PREFIX
+    ).count()
+    password = make_password(PASSWORD)
+    users = CustomUser.objects.bulk_create(
+        [
+            CustomUser(
+                username=f'{USERNAME_PREFIX}{number}',
+                email=f'{USERNAME_PREFIX}{number}@example.com',
+                first_name=WORDS[number % len(WORDS)].capitalize(),
+                last_name=f'Тестовый {number}',
+                password=password,
+            )
+            for number in range(offset, offset + count)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return [user.id for user in users]
+
+
+def create_recipes(
+    rnd, count, author_ids, ingredient_ids, tag_ids, ingredients_per_recipe
+):
+    """Рецепты пачками по BATCH_SIZE вместе с ингредиентами и тегами."""
+    recipe_ids = []
+    for start in range(0, count, BATCH_SIZE):
+        recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    name=' '.join(rnd.sample(WORDS, 3)).capitalize(),
+                    description=' '.join(rnd.choices(WORDS, k=30))[
+                        :DESCRIPTION_MAX_LENGTH
+                    ],
+                    time_to_cook=rnd.randint(5, 180),
+                    author_id=skewed_choice(rnd, author_ids),
+                )
+                for _ in range(min(BATCH_SIZE, count - start))
+            ]
+        )
+        IngredientsInRecipe.objects.bulk_create(
+            [
+                IngredientsInRecipe(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=rnd.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in rnd.sample(
+                    ingredient_ids,
+                    min(
+                        rnd.randint(
+                            max(ingredients_per_recipe // 2, 1),
+                            ingredients_per_recipe * 3 // 2,
+                        ),
+                        len(ingredient_ids),
+                    ),
+                )
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        if tag_ids:
+            Recipe.tags.through.objects.bulk_create(
+                [
+                    Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in rnd.sample(
+                        tag_ids, min(rnd.randint(1, 3), len(tag_ids))
+                    )
+                ],
+                batch_size=BATCH_SIZE,
+            )
+        recipe_ids += [recipe.id for recipe in recipes]
+    return recipe_ids
+
+
+def create_links(rnd, model, user_ids, target_field, target_ids, per_user):
+    """Связи пользователь -> цели, в среднем per_user на пользователя."""
+    if not per_user or not target_ids:
+        return 0
+    total = 0
+    for chunk in batches(user_ids, max(BATCH_SIZE // per_user, 1)):
+        links = [
+            model(user_id=user_id, **{f'{target_field}_id': target_id})
+            for user_id in chunk
+            for target_id in skewed_sample(
+                rnd, target_ids, rnd.randint(0, per_user * 2)
+            )
+            if model is not Subscribe or target_id != user_id
+        ]
+        if model is ShoppingList:
+            for link in links:
+                link.servings = rnd.choice((1, 1, 1, 2, 2, 4))
+        model.objects.bulk_create(links, ignore_conflicts=True)
+        total += len(links)
+    return total
+
+
+def rebuild_shopping_carts(user_ids):
+    ShoppingCartIngredient.objects.filter(user_id__in=user_ids).delete()
+    for chunk in batches(user_ids):
+        ShoppingCartIngredient.objects.bulk_create(
+            [
+                ShoppingCartIngredient(
+                    user_id=row['user'],
+                    ingredient_id=row['ingredient'],
+                    amount=row['total'],
+                )
+                for row in ShoppingCartIngredient.objects.calculate(chunk)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def generate(
+    rnd,
+    users,
+    recipes,
+    ingredients=500,
+    tags=12,
+    ingredients_per_recipe=8,
+    favorites=20,
+    cart=5,
+    subscriptions=10,
+):
+    """
+    Заполняет базу синтетическими данными пакетными INSERT.
+
+    bulk_create обходит сигналы, поэтому в конце одним проходом
+    досчитываются счётчики, агрегат корзин и поисковые векторы.
+    Возвращает {модель: число созданных строк}.
+    """
+    with transaction.atomic():
+        ingredient_ids = create_ingredients(ingredients)
+        tag_ids = create_tags(tags)
+        user_ids = create_users(users)
+        recipe_ids = create_recipes(
+            rnd,
+            recipes,
+            user_ids,
+            ingredient_ids,
+            tag_ids,
+            ingredients_per_recipe,
+        )
+        created = {
+            'users': len(user_ids),
+            'recipes': len(recipe_ids),
+            'favorites': create_links(
+                rnd, Favourite, user_ids, 'recipe', recipe_ids, favorites
+            ),
+            'shopping_carts': create_links(
+                rnd, ShoppingList, user_ids, 'recipe', recipe_ids, cart
+            ),
+            'subscriptions': create_links(
+                rnd, Subscribe, user_ids, 'author', user_ids, subscriptions
+            ),
+        }
+        rebuild_shopping_carts(user_ids)
+        if recipe_ids:
+            update_search_vectors(
+                Recipe.objects.filter(
+                    id__gte=recipe_ids[0], id__lte=recipe_ids[-1]
+                )
+            )
+        reconcile_counters()
+    bump_version(IngredientsInRecipe)
+    return created
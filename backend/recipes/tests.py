@@ -0,0 +1,273 @@
+import io
+import json
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from foodgram.settings import IMPORT_JOB_MAX_ATTEMPTS, IMPORT_JOB_STALE_SECONDS
+from recipes.importers import (
+    ImportResult,
+    claim_import_job,
+    import_ingredients,
+    read_json_array,
+    requeue_stale_jobs,
+    save_job_progress,
+)
+from recipes.models import (
+    Ingredient,
+    IngredientImport,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingCartIngredient,
+    ShoppingList,
+)
+from recipes.pantry import PantryIndex, PantryMatch
+from recipes.versions import bump_version, get_version
+from users.models import CustomUser
+
+
+class ReadJsonArrayTests(SimpleTestCase):
+    ROWS = [
+        {'name': 'Соль', 'measurement_unit': 'г'},
+        ['Мука', 'кг'],
+        -1.5e3,
+        12345678,
+        'строка с "кавычками", запятой и ]',
+        None,
+        {},
+    ]
+
+    def test_reads_elements_across_chunk_boundaries(self):
+        text = json.dumps(self.ROWS, ensure_ascii=False, indent=2)
+        for read_size in (1, 2, 3, 7, 1024):
+            with self.subTest(read_size=read_size):
+                self.assertEqual(
+                    list(read_json_array(io.StringIO(text), read_size)),
+                    self.ROWS,
+                )
+
+    def test_empty_array(self):
+        self.assertEqual(list(read_json_array(io.StringIO(' [ ] '))), [])
+
+    def test_malformed_documents(self):
+        for text in ('', '{"name": "Соль"}', '[1, 2', '[1 2]', '[1,]'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    list(read_json_array(io.StringIO(text), 2))
+
+
+class ImportIngredientsTests(TestCase):
+    def test_json_import(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field('measurement_unit').max_length
+        rows = [
+            {'name': 'Соль', 'measurement_unit': 'г'},
+            {'name': 'Мука', 'measurement_unit': 'кг'},
+            {'name': 'Мука', 'measurement_unit': 'кг'},
+            {'name': '', 'measurement_unit': 'г'},
+            {'name': 'Х' * (name_length + 1), 'measurement_unit': 'г'},
+            {
+                'name': 'Перец',
+                'measurement_unit': 'г' * (unit_length + 1),
+            },
+        ]
+        result = import_ingredients(
+            io.StringIO(json.dumps(rows, ensure_ascii=False)),
+            'json',
+            chunk_size=2,
+        )
+        self.assertEqual(
+            (result.inserted, result.skipped, result.duplicates),
+            (1, 1, 1),
+        )
+        self.assertEqual(result.invalid, 3)
+        self.assertEqual(len(result.errors), 3)
+        self.assertTrue(
+            Ingredient.objects.filter(
+                name='Мука', measurement_unit='кг'
+            ).exists()
+        )
+
+
+class ImportQueueTests(TestCase):
+    def create_job(self, **fields):
+        return IngredientImport.objects.create(
+            csv_file='ingredients/ingredients.csv', **fields
+        )
+
+    def create_running_job(self, silent_seconds, attempts=1):
+        return self.create_job(
+            status=IngredientImport.RUNNING,
+            attempts=attempts,
+            heartbeat_at=timezone.now() - timedelta(seconds=silent_seconds),
+        )
+
+    def test_claim_sets_heartbeat_and_attempts(self):
+        job = self.create_job()
+        claimed = claim_import_job()
+        self.assertEqual(claimed, job)
+        self.assertEqual(claimed.status, IngredientImport.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNotNone(claimed.heartbeat_at)
+        self.assertIsNone(claim_import_job())
+
+    def test_stale_job_is_claimed_again(self):
+        job = self.create_running_job(IMPORT_JOB_STALE_SECONDS + 1)
+        claimed = claim_import_job()
+        self.assertEqual(claimed, job)
+        self.assertEqual(claimed.attempts, 2)
+        self.assertGreater(claimed.heartbeat_at, job.heartbeat_at)
+
+    def test_live_job_is_not_requeued(self):
+        job = self.create_running_job(IMPORT_JOB_STALE_SECONDS - 60)
+        self.assertEqual(requeue_stale_jobs(), (0, 0))
+        self.assertIsNone(claim_import_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngredientImport.RUNNING)
+
+    def test_job_fails_after_max_attempts(self):
+        job = self.create_running_job(
+            IMPORT_JOB_STALE_SECONDS + 1, attempts=IMPORT_JOB_MAX_ATTEMPTS
+        )
+        self.assertEqual(requeue_stale_jobs(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngredientImport.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_progress_updates_heartbeat(self):
+        job = self.create_running_job(IMPORT_JOB_STALE_SECONDS + 1)
+        save_job_progress(job, ImportResult(inserted=10))
+        self.assertEqual(requeue_stale_jobs(), (0, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.inserted, 10)
+
+
+class CartAggregateSignalTests(TestCase):
+    """Агрегат списка покупок следует за изменениями через ORM."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass'
+        )
+        cls.salt, cls.flour = Ingredient.objects.bulk_create(
+            [
+                Ingredient(name='Соль', measurement_unit='г'),
+                Ingredient(name='Мука', measurement_unit='г'),
+            ]
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Хлеб', description='Описание', time_to_cook=10
+        )
+        cls.salt_row = IngredientsInRecipe.objects.create(
+            recipe=cls.recipe, ingredient=cls.salt, amount=5
+        )
+        IngredientsInRecipe.objects.create(
+            recipe=cls.recipe, ingredient=cls.flour, amount=100
+        )
+
+    def setUp(self):
+        self.entry = ShoppingList.objects.create(
+            user=self.user, recipe=self.recipe, servings=2
+        )
+
+    def assertAggregate(self, expected):
+        self.assertEqual(
+            dict(
+                ShoppingCartIngredient.objects.filter(
+                    user=self.user
+                ).values_list('ingredient_id', 'amount')
+            ),
+            expected,
+        )
+
+    def test_cart_entry_saved(self):
+        self.assertAggregate({self.salt.id: 10, self.flour.id: 200})
+        self.entry.servings = 3
+        self.entry.save()
+        self.assertAggregate({self.salt.id: 15, self.flour.id: 300})
+
+    def test_cart_entry_deleted(self):
+        self.entry.delete()
+        self.assertAggregate({})
+
+    def test_recipe_ingredient_changed(self):
+        self.salt_row.amount = 7
+        self.salt_row.save()
+        self.assertAggregate({self.salt.id: 14, self.flour.id: 200})
+        self.salt_row.delete()
+        self.assertAggregate({self.flour.id: 200})
+
+    def test_recipe_deleted(self):
+        self.recipe.delete()
+        self.assertAggregate({})
+
+    def test_ingredient_deleted(self):
+        self.flour.delete()
+        self.assertAggregate({self.salt.id: 10})
+
+    def test_rebuild_command(self):
+        ShoppingCartIngredient.objects.filter(ingredient=self.salt).update(
+            amount=1
+        )
+        ShoppingCartIngredient.objects.filter(ingredient=self.flour).delete()
+        call_command(
+            'shopping_cart_aggregate', rebuild=True, stdout=io.StringIO()
+        )
+        self.assertAggregate({self.salt.id: 10, self.flour.id: 200})
+
+
+class DataVersionTests(TestCase):
+    def test_bump_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version(Ingredient)
+            self.assertEqual(get_version(Ingredient), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version(Ingredient)
+        self.assertEqual(get_version(Ingredient), 2)
+        self.assertEqual(get_version(Recipe), 0)
+
+
+class UpdateSearchVectorsTests(TestCase):
+    def test_missing_vectors_are_filled(self):
+        recipes = [
+            Recipe.objects.create(
+                name=f'Суп {number}', description='Описание', time_to_cook=5
+            )
+            for number in range(3)
+        ]
+        Recipe.objects.filter(id=recipes[0].id).update(search_vector=None)
+        output = io.StringIO()
+        call_command('update_search_vectors', missing=True, stdout=output)
+        self.assertFalse(
+            Recipe.objects.filter(search_vector__isnull=True).exists()
+        )
+        self.assertIn('пересчитаны: 1', output.getvalue())
+
+
+class PantryIndexTests(TestCase):
+    def test_match_reads_one_snapshot(self):
+        index = PantryIndex()
+        snapshot = index.build(get_version(IngredientsInRecipe))
+        recipe = Recipe.objects.create(
+            name='Хлеб', description='Описание', time_to_cook=10
+        )
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        IngredientsInRecipe.objects.create(
+            recipe=recipe, ingredient=salt, amount=5
+        )
+        index.build(get_version(IngredientsInRecipe))
+        self.assertEqual(
+            index.match([salt.id], 0), [PantryMatch(recipe.id, 1, 1)]
+        )
+        # Снимок, собранный до рецепта, не знает о нём целиком.
+        index.snapshot = snapshot
+        self.assertEqual(index.match([salt.id], 0), [])
+        # Рецепт, которого нет в числах ингредиентов, пропускается.
+        index.snapshot = snapshot._replace(
+            postings={salt.id: [recipe.id]}
+        )
+        self.assertEqual(index.match([salt.id], 0), [])
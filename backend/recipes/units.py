@@ -0,0 +1,26 @@
+from django.db.models import Case, F, IntegerField, Value, When
+
+from foodgram.settings import UNIT_CONVERSIONS
+
+
+def base_unit(field):
+    """Базовая единица для единицы из field: кг -> г, л -> мл и т. д."""
+    return Case(
+        *(
+            When(**{field: unit}, then=Value(base))
+            for unit, (base, _) in UNIT_CONVERSIONS.items()
+        ),
+        default=F(field),
+    )
+
+
+def unit_factor(field):
+    """Сколько базовых единиц в единице из field."""
+    return Case(
+        *(
+            When(**{field: unit}, then=Value(factor))
+            for unit, (_, factor) in UNIT_CONVERSIONS.items()
+        ),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
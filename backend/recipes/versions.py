@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models import F
+
+from recipes.models import DataVersion
+
+
+def version_label(model):
+    return model._meta.label_lower
+
+
+def get_versions(models):
+    """
+    Версии нескольких моделей одним запросом.
+
+    Версии лежат в БД, а не в кэше: с кэшем в памяти процесса изменение
+    в одном воркере (или в воркере импорта) не видели бы остальные.
+    """
+    labels = [version_label(model) for model in models]
+    versions = dict(
+        DataVersion.objects.filter(label__in=labels).values_list(
+            'label', 'version'
+        )
+    )
+    return [versions.get(label, 0) for label in labels]
+
+
+def get_version(model):
+    return get_versions([model])[0]
+
+
+def bump_version(model):
+    """
+    Новая версия после коммита: откат не должен сбрасывать кэш, а
+    читатель до коммита - класть в кэш старые данные под новой версией.
+    Отдельная короткая транзакция не держит блокировку строки версии
+    до конца транзакции, которая её подняла.
+    """
+    transaction.on_commit(lambda: increment_version(model))
+
+
+def increment_version(model):
+    versions = DataVersion.objects.filter(label=version_label(model))
+    if versions.update(version=F('version') + 1):
+        return
+    _, created = DataVersion.objects.get_or_create(
+        label=version_label(model), defaults={'version': 1}
+    )
+    if not created:
+        versions.update(version=F('version') + 1)
+
+
+async def aget_versions(models):
+    """Версии нескольких моделей одним запросом."""
+    labels = [version_label(model) for model in models]
+    versions = {
+        label: version
+        async for label, version in DataVersion.objects.filter(
+            label__in=labels
+        ).values_list('label', 'version')
+    }
+    return [versions.get(label, 0) for label in labels]
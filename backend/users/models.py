@@ -36,6 +36,12 @@ class CustomUser(AbstractUser):
     last_name = models.CharField(
         max_length=MAX_LENGTH, blank=True, verbose_name='Фамилия'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписчиков'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []